@@ -0,0 +1,483 @@
+# benchmarks.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+# Micro benchmarks for the game engine and the search agents.
+#
+# Run one with:     python benchmarks.py <name> [arg=value ...]
+# List them with:   python benchmarks.py
+
+import sys, time, random
+import multiprocessing
+import layout
+from pacman import GameState, parseAgentArgs
+from util import deepSizeOf
+
+def timeIt(function, repeat):
+    "Returns the mean seconds taken by one call of function over `repeat` calls"
+    start = time.time()
+    for i in range(repeat):
+        function()
+    return (time.time() - start) / repeat
+
+def initialState(layoutName, numGhosts=1):
+    "layoutName may also be a Layout"
+    lay = layoutName
+    if isinstance(lay, str): lay = layout.getLayout(layoutName)
+    state = GameState()
+    state.initialize(lay, numGhosts)
+    return state
+
+def ghostLayout(layoutName, numGhosts):
+    """
+    The layout with ghosts added on food cells spread evenly through the
+    maze text, until it has numGhosts of them.
+    """
+    lay = layout.getLayout(layoutName)
+    text = [list(row) for row in lay.layoutText]
+    extra = numGhosts - lay.getNumGhosts()
+    food = [(y, x) for y, row in enumerate(text) for x, char in enumerate(row) if char == '.']
+    for i in range(max(0, extra)):
+        y, x = food[i * len(food) // extra]
+        text[y][x] = 'G'
+    return layout.internLayout([''.join(row) for row in text])
+
+def benchLayoutCopy(layoutName='originalClassic', repeat=2000):
+    """
+    Game.run deep-copies the state for every agent's observation on every
+    turn.  Compares GameState.deepCopy sharing the frozen layout against the
+    old behaviour of re-parsing the layout on every copy.
+    """
+    state = initialState(layoutName)
+    def reparsingCopy():
+        copy = state.deepCopy()
+        copy.data.layout = state.data.layout.mutableCopy()
+        return copy
+    shared = timeIt(state.deepCopy, repeat)
+    reparsed = timeIt(reparsingCopy, repeat)
+    print 'Layout %s, %d copies' % (layoutName, repeat)
+    print '  deepCopy, re-parsed layout: %8.1f us/copy' % (reparsed * 1e6)
+    print '  deepCopy, shared layout:    %8.1f us/copy' % (shared * 1e6)
+    print '  per-move saving:            %8.1fx' % (reparsed / shared)
+
+def searchStates(layoutName, numStates, numGhosts=1):
+    """
+    Returns a reproducible sample of non-terminal Pacman-to-move states from
+    random play on the layout.
+    """
+    rng = random.Random(numStates)
+    state = initialState(layoutName, numGhosts)
+    states = []
+    while len(states) < numStates:
+        if state.isGhostWin() or state.isGhostLose():
+            state = initialState(layoutName, numGhosts)
+        states.append(state)
+        for agentIndex in range(state.getNumAgents()):
+            if state.isGhostWin() or state.isGhostLose(): break
+            state = state.generateSuccessor(agentIndex, rng.choice(state.getLegalActions(agentIndex)))
+    return states
+
+def benchSearchDepth(layoutName='originalClassic', minDepth=5, maxDepth=7, numStates=20, agent='MultimaxAgent', searchMode='multimax', ttSize=0, ordering=False):
+    """
+    Seconds per MultimaxAgent decision and nodes searched per second at each
+    depth, over the same sample of states.  Compare search modes at equal
+    depth with searchMode=..., with a transposition table with ttSize=...
+    and with move ordering with ordering=True.
+    """
+    import multiAgents
+    states = searchStates(layoutName, numStates)
+    print '%s (%s) on %s, %d states' % (agent, searchMode, layoutName, numStates)
+    for depth in range(minDepth, maxDepth + 1):
+        searcher = getattr(multiAgents, agent)(0, depth=depth, searchMode=searchMode, ttSize=ttSize, ordering=ordering)
+        start = time.time()
+        for state in states:
+            searcher.getAction(state)
+        elapsed = time.time() - start
+        print '  depth %d: %7.3f s/move %9d nodes/move %9.0f nodes/s' % \
+            (depth, elapsed / numStates, searcher.getNodeNum() / numStates, searcher.getNodeNum() / elapsed)
+        if searcher.orderedNodes:
+            print '           first child best at %d/%d nodes (%.2f)' % \
+                (searcher.firstBest, searcher.orderedNodes, searcher.firstBest / float(searcher.orderedNodes))
+        table = searcher.transpositionTable
+        if table is not None:
+            print '           table: %d hits, %d misses, %d evictions, %d entries' % \
+                (table.hits, table.misses, table.evictions, len(table))
+
+def plainMinimax(searcher, state, agentIndex, depth):
+    """
+    The paranoid value of state for searcher, without pruning or tables:
+    the searcher maximizes its evaluated score and every other agent
+    minimizes it.
+    """
+    legal = searcher.getSearchActions(state, agentIndex)
+    if depth == 0 or not legal: return searcher.evaluator.evaluate(state)[searcher.index]
+    nextAgent = (agentIndex + 1) % state.getNumAgents()
+    values = []
+    for action in legal:
+        undo = state.makeMove(agentIndex, action, validate=False)
+        values.append(plainMinimax(searcher, state, nextAgent, depth - 1))
+        state.unmakeMove(undo)
+    if agentIndex == searcher.index: return max(values)
+    return min(values)
+
+def benchSearchModes(layoutName='mediumClassic', depth=6, numStates=20, evaluator='ScoreEvaluator'):
+    """
+    Checks the equivalences between MultimaxAgent's search modes over the
+    same sample of states: the paranoid and batched modes find the best
+    actions and value of a plain minimax, and the shallow mode those of
+    maxn (with the score evaluator only).  Exits with status 1 when a mode
+    decides differently, and also gives the nodes each mode searched.
+    """
+    import multiAgents
+    states = searchStates(layoutName, numStates)
+    print 'MultimaxAgent search modes on %s, depth %d, %d states, %s' % (layoutName, depth, numStates, evaluator)
+    reference = multiAgents.MultimaxAgent(0, depth=depth, evaluator=evaluator)
+    plain = []
+    for i, state in enumerate(states):
+        random.seed(i)
+        values = {}
+        for action in reference.getSearchActions(state, 0):
+            undo = state.makeMove(0, action, validate=False)
+            values[action] = plainMinimax(reference, state, 1, depth - 1)
+            state.unmakeMove(undo)
+        best = max(values.values())
+        plain.append((set([action for action in values if values[action] == best]), best))
+
+    checks = [('paranoid', plain), ('batched', plain)]
+    if reference.evaluator.scoresOnly: checks.append(('shallow', 'maxn'))
+    results = {}
+    failed = False
+    for mode in ['maxn'] + [mode for mode, expected in checks]:
+        searcher = multiAgents.MultimaxAgent(0, depth=depth, searchMode=mode, evaluator=evaluator)
+        results[mode] = []
+        for i, state in enumerate(states):
+            random.seed(i)
+            bestActions, values = searcher.searchRoot(state, depth, searcher.getSearchActions(state, 0))
+            results[mode].append((set(bestActions), values[bestActions[0]]))
+        results[mode + ' nodes'] = searcher.getNodeNum()
+    for mode, expected in checks:
+        name = expected
+        if expected is plain: name = 'plain minimax'
+        else: expected = results[expected]
+        same = results[mode] == expected
+        failed = failed or not same
+        print '  %-9s %9d nodes/move  %s as %s' % \
+            (mode + ':', results[mode + ' nodes'] / numStates, same and 'same decisions' or 'DIFFERENT DECISIONS', name)
+    if failed: sys.exit(1)
+
+def benchParallelSearch(layoutName='originalClassic', depth=8, numStates=20, searchMode='paranoid', maxWorkers=8, splitDepth=1):
+    """
+    Seconds per MultimaxAgent decision with the root search split over 1, 2,
+    4, ... maxWorkers processes, and the speedup over the serial search.
+    Also checks that every worker count makes the same decisions.
+    """
+    import multiAgents
+    states = searchStates(layoutName, numStates)
+    print '%s search on %s, depth %d, %d states, split depth %d, %d cores' % \
+        (searchMode, layoutName, depth, numStates, splitDepth, multiprocessing.cpu_count())
+    workers = 1
+    while workers <= maxWorkers:
+        searcher = multiAgents.MultimaxAgent(0, depth=depth, searchMode=searchMode, workers=workers, splitDepth=splitDepth)
+        if workers > 1: searcher.getPool() # Not timing the pool start up
+        actions = []
+        start = time.time()
+        for i, state in enumerate(states):
+            random.seed(i)
+            actions.append(searcher.getAction(state))
+        elapsed = time.time() - start
+        if workers == 1: serialTime, serialActions = elapsed, actions
+        print '  %2d workers: %7.3f s/move  speedup %5.2fx  %s' % \
+            (workers, elapsed / numStates, serialTime / elapsed,
+             actions == serialActions and 'same decisions' or 'DIFFERENT DECISIONS')
+        searcher.stopPool()
+        workers *= 2
+
+def benchExpectimax(layoutName='smallClassic', depth=4, numStates=20, numGhosts=1):
+    """
+    Nodes per decision of ExpectimaxAgent against random opponent and ghosts, with each
+    chance node pruning, next to MultimaxAgent's paranoid search at the same
+    depth.  Also checks that the pruning keeps the decisions of the search
+    without it.
+    """
+    import multiAgents
+    states = searchStates(layoutName, numStates, numGhosts)
+    agents = [None] + [multiAgents.RandomAgent(i) for i in range(1, numGhosts + 2)]
+    print 'ExpectimaxAgent on %s, depth %d, random opponent and %d random ghosts, %d states' % (layoutName, depth, numGhosts, numStates)
+    searchers = [('multimax', multiAgents.MultimaxAgent(0, depth=depth)),
+                 ('multimax, paranoid', multiAgents.MultimaxAgent(0, depth=depth, searchMode='paranoid'))]
+    for pruning in multiAgents.ExpectimaxAgent.PRUNING:
+        searcher = multiAgents.ExpectimaxAgent(0, depth=depth, pruning=pruning)
+        searcher.registerAgents(agents)
+        searchers.append(('expectimax, ' + pruning, searcher))
+    for name, searcher in searchers:
+        actions = []
+        start = time.time()
+        for i, state in enumerate(states):
+            random.seed(i)
+            actions.append(searcher.getAction(state))
+        elapsed = time.time() - start
+        if name == 'expectimax, none': exactActions = actions
+        check = ''
+        if name.startswith('expectimax') and name != 'expectimax, none':
+            check = actions == exactActions and '  same decisions' or '  DIFFERENT DECISIONS'
+        print '  %-20s %7.3f s/move %9d nodes/move%s' % (name + ':', elapsed / numStates, searcher.getNodeNum() / numStates, check)
+
+def routeLookahead(graph, cell, depth):
+    """
+    The fewest cells, and the mean over equally likely route choices, that
+    depth routes of the JunctionGraph cover from cell.
+    """
+    if depth == 0: return 0, 0.0
+    lookaheads = []
+    for actions, cells in graph.getRoutes(cell):
+        fewest, mean = routeLookahead(graph, cells[-1], depth - 1)
+        lookaheads.append((len(cells) + fewest, len(cells) + mean))
+    return min([l[0] for l in lookaheads]), sum([l[1] for l in lookaheads]) / len(lookaheads)
+
+def benchMacroSearch(layoutName='originalClassic', numStates=20, depth=5, minMacroDepth=2, maxMacroDepth=4, macroRadius=2):
+    """
+    Nodes per MultimaxAgent decision and how many cells of its own moves the
+    searcher looks ahead, for the paranoid search at depth and for the macro
+    search at each macro depth (routes between junctions), with the cost of
+    each as a multiple of the paranoid search's.  Paranoid search looks one
+    cell ahead per round of all agents' moves.
+    """
+    import multiAgents
+    states = searchStates(layoutName, numStates)
+    numAgents = states[0].getNumAgents()
+    graph = states[0].getJunctionGraph()
+    corridors = [corridor for cell in range(len(graph.corridors)) for corridor in graph.corridors[cell]]
+    print 'MultimaxAgent on %s, %d states, %d agents, %d junctions, corridors of %.1f cells on average' % \
+        (layoutName, numStates, numAgents, graph.getNumJunctions(), sum([c.length for c in corridors]) / float(len(corridors)))
+    searches = [('paranoid', depth)] + [('macro', d) for d in range(minMacroDepth, maxMacroDepth + 1)]
+    paranoid = None
+    for searchMode, searchDepth in searches:
+        searcher = multiAgents.MultimaxAgent(0, depth=searchDepth, searchMode=searchMode, macroRadius=macroRadius)
+        start = time.time()
+        for state in states:
+            searcher.getAction(state)
+        elapsed = time.time() - start
+        if searchMode == 'paranoid':
+            fewest = mean = (searchDepth + numAgents - 1) // numAgents
+        else:
+            lookaheads = [routeLookahead(graph, state.getMoveTable().getCell(state.data.agentStates[0].configuration), searchDepth)
+                          for state in states]
+            fewest = min([l[0] for l in lookaheads])
+            mean = sum([l[1] for l in lookaheads]) / numStates
+        if paranoid is None: paranoid = (elapsed, searcher.getNodeNum())
+        print '  %-8s depth %d: %7.3f s/move %8d nodes/move  looks %2d-%4.1f cells ahead, x%.1f the time and x%.1f the nodes of paranoid' % \
+            (searchMode, searchDepth, elapsed / numStates, searcher.getNodeNum() / numStates, fewest, mean,
+             elapsed / max(paranoid[0], 1e-6), searcher.getNodeNum() / float(paranoid[1]))
+
+def playGames(layoutName, pacman, numGames):
+    """
+    Plays numGames quiet games of pacman against the command line's default
+    opponent and ghosts, seeding game i with i.  Returns the games.
+    """
+    import multiAgents, textDisplay, StringIO
+    from pacman import ClassicGameRules
+    lay = layout.getLayout(layoutName)
+    rules = ClassicGameRules()
+    games = []
+    for i in range(numGames):
+        random.seed(i)
+        ghosts = [multiAgents.MultimaxAgent(index) for index in range(2, lay.getNumGhosts() + 2)]
+        game = rules.newGame(lay, pacman, ghosts, multiAgents.RandomAgent(1), textDisplay.NullGraphics(), True)
+        stdout, sys.stdout = sys.stdout, StringIO.StringIO() # The rules print every game's scores
+        try: game.run()
+        finally: sys.stdout = stdout
+        games.append(game)
+    return games
+
+def benchEvaluator(layoutName='smallClassic', numGames=10, shallowDepth=3, deepDepth=9, searchMode='paranoid'):
+    """
+    Games won, Pacman's mean score and nodes searched per move of a shallow
+    MultimaxAgent search scored by MazeDistanceEvaluator, against a deep
+    search of the raw game scores.  Also times the evaluators.
+    """
+    import multiAgents, evaluators
+    print 'MultimaxAgent (%s) on %s, %d games' % (searchMode, layoutName, numGames)
+    for depth, evaluator in ((deepDepth, 'ScoreEvaluator'), (shallowDepth, 'ScoreEvaluator'),
+                             (shallowDepth, 'MazeDistanceEvaluator')):
+        pacman = multiAgents.MultimaxAgent(0, depth=depth, searchMode=searchMode, evaluator=evaluator)
+        start = time.time()
+        games = playGames(layoutName, pacman, numGames)
+        elapsed = time.time() - start
+        moves = sum([len(game.moveHistory) for game in games]) / float(len(games[0].agents))
+        print '  depth %2d %-22s %2d wins  mean score %7.1f %8.0f nodes/move %7.3f s/game' % \
+            (depth, evaluator + ':', len([game for game in games if game.state.isPacWin()]),
+             sum([game.state.getScores()[0] for game in games]) / numGames,
+             pacman.getNodeNum() / moves, elapsed / numGames)
+
+    states = searchStates(layoutName, 200)
+    states[0].getMazeDistances() # Not timing the table's construction
+    for name in ('ScoreEvaluator', 'MazeDistanceEvaluator'):
+        evaluator = getattr(evaluators, name)()
+        seconds = timeIt(lambda: [evaluator.evaluate(state) for state in states], 10) / len(states)
+        print '  %-22s %8.1f us/evaluation' % (name + ':', seconds * 1e6)
+
+def benchBatchedLeaves(layoutName='mediumClassic', numStates=2000, depth=6, numSearches=20):
+    """
+    Leaf throughput, in positions per second, of every evaluator one
+    position at a time and in one evaluateBatch call over numStates
+    positions, counting the time to add them to the LeafBatch.  Then the
+    seconds and nodes per move of MultimaxAgent's paranoid search against
+    its batched mode, with MazeDistanceEvaluator.
+    """
+    import multiAgents, evaluators
+    states = searchStates(layoutName, numStates)
+    states[0].getMazeDistances().getMatrix() # Not timing the tables' construction
+    print 'Leaf evaluation on %s, %d positions' % (layoutName, numStates)
+    for name in ('ScoreEvaluator', 'MazeDistanceEvaluator'):
+        evaluator = getattr(evaluators, name)()
+        def evaluateBatch():
+            batch = evaluators.LeafBatch(states[0])
+            for state in states: batch.add(state)
+            return evaluator.evaluateBatch(batch)
+        scalar = timeIt(lambda: [evaluator.evaluate(state) for state in states], 3)
+        batched = timeIt(evaluateBatch, 3)
+        print '  %-22s scalar %9.0f positions/s  batched %9.0f positions/s' % \
+            (name + ':', numStates / scalar, numStates / batched)
+
+    print 'MultimaxAgent on %s, depth %d, %d states' % (layoutName, depth, numSearches)
+    for searchMode in ('paranoid', 'batched'):
+        searcher = multiAgents.MultimaxAgent(0, depth=depth, searchMode=searchMode, evaluator='MazeDistanceEvaluator')
+        start = time.time()
+        for state in states[:numSearches]:
+            searcher.getAction(state)
+        elapsed = time.time() - start
+        print '  %-8s %7.3f s/move %9d nodes/move' % \
+            (searchMode + ':', elapsed / numSearches, searcher.getNodeNum() / numSearches)
+
+def benchManyGhosts(layoutName='mediumClassic', rounds=2, numStates=10, maxGhosts=16, maxJointGhosts=4):
+    """
+    Nodes and seconds per MultimaxAgent decision with 1, 4, ... maxGhosts
+    ghosts (added to the layout by ghostLayout), searching `rounds` moves
+    of every agent ahead: in factored mode, where the ghosts move as one
+    ply, and in paranoid mode, where every ghost is a ply of its own, up to
+    maxJointGhosts ghosts.
+    """
+    import multiAgents
+    print 'MultimaxAgent on %s, %d rounds ahead, %d states' % (layoutName, rounds, numStates)
+    numGhosts = 1
+    while numGhosts <= maxGhosts:
+        states = searchStates(ghostLayout(layoutName, numGhosts), numStates, numGhosts)
+        searches = [('factored', rounds * 3)]
+        if numGhosts <= maxJointGhosts: searches.append(('paranoid', rounds * (numGhosts + 2)))
+        for searchMode, depth in searches:
+            searcher = multiAgents.MultimaxAgent(0, depth=depth, searchMode=searchMode)
+            start = time.time()
+            for state in states:
+                searcher.getAction(state)
+            elapsed = time.time() - start
+            print '  %2d ghosts, %-8s depth %2d: %7.3f s/move %9d nodes/move' % \
+                (numGhosts, searchMode, depth, elapsed / numStates, searcher.getNodeNum() / numStates)
+        numGhosts *= 4
+
+def benchMazeDistances(layoutName='originalClassic', numStates=200):
+    """
+    Seconds to build the layout's MazeDistances and its starting food
+    distance field (see GameState.getFoodDistances), the bytes of its int16
+    matrix, which is all it keeps, and the microseconds per distance(a, b),
+    per distances(a, cells) over the food, and per nearest food distance
+    from a cell next to Pacman: from a row of the matrix, and with
+    featureExtractors.closestFood by breadth first search and from the
+    state's food distance field, on states from random play.
+    """
+    import featureExtractors
+    states = searchStates(layoutName, numStates)
+    lay = states[0].data.layout
+    start = time.time()
+    distances = lay.getMazeDistances()
+    build = time.time() - start
+    start = time.time()
+    lay.getFoodDistances()
+    foodField = time.time() - start
+    print 'MazeDistances of %s, %d cells' % (layoutName, distances.numCells)
+    print '  build:              %8.3f s' % build
+    print '  starting food field:%8.3f s' % foodField
+    print '  int16 matrix:       %8.1f KB' % (distances.getMatrix().nbytes / 1024.0)
+
+    getCell = distances.getCell
+    pairs = [(getCell(state.getPacmanPosition()), getCell(state.getGhostPosition(2))) for state in states]
+    foods = [(getCell(state.getPacmanPosition()), state.getFood().getCells()) for state in states]
+    seconds = timeIt(lambda: [distances.distance(a, b) for a, b in pairs], 20) / numStates
+    print '  distance(a, b):     %8.2f us' % (seconds * 1e6)
+    seconds = timeIt(lambda: [distances.distances(a, cells) for a, cells in foods], 20) / numStates
+    print '  distances(a, food): %8.2f us' % (seconds * 1e6)
+    # As SimpleExtractor asks: in game order, from every cell Pacman can move to
+    moves = states[0].getMoveTable()
+    queries = [(state, moves.getLegalNeighbors(state.getPacmanPosition())) for state in states]
+    numQueries = sum([len(cells) for state, cells in queries])
+    def nearestByRow():
+        for state, cells in queries:
+            for cell in cells:
+                distances.distances(getCell(cell), state.getFood().getMask()).min()
+    def nearestBySearch():
+        for state, cells in queries:
+            for cell in cells:
+                featureExtractors.closestFood(cell, state.getFood(), state.getWalls())
+    def nearestByField():
+        for state, cells in queries:
+            for cell in cells:
+                featureExtractors.closestFood(cell, state.getFood(), state.getWalls(), state)
+    print '  nearest food, row:  %8.2f us' % (timeIt(nearestByRow, 1) / numQueries * 1e6)
+    print '  closestFood, BFS:   %8.2f us' % (timeIt(nearestBySearch, 1) / numQueries * 1e6)
+    print '  closestFood, field: %8.2f us' % (timeIt(nearestByField, 1) / numQueries * 1e6)
+
+def benchStateMemory(layoutName='originalClassic', numStates=200):
+    """
+    Bytes per GameState, not counting what every state of a game shares (the
+    layout, the hashing keys, the food distance fields and the action
+    strings).  Also reports the bytes per state when successor states are
+    kept alive together, as Q-learning does, since successors share
+    unchanged configurations.
+    """
+    states = searchStates(layoutName, numStates)
+    data = states[0].data
+    shared = set([id(data.layout), id(getattr(data, '_keys', None))] +
+                 [id(getattr(state.data, '_foodDistances', None)) for state in states])
+    one = sum([deepSizeOf(state, shared) for state in states]) / float(numStates)
+    seen = set()
+    together = sum([deepSizeOf(state, shared, seen) for state in states]) / float(numStates)
+    print 'GameState memory on %s, %d states' % (layoutName, numStates)
+    print '  bytes per state, alone:        %8.0f' % one
+    print '  bytes per state, kept together: %7.0f' % together
+
+BENCHMARKS = {
+    'batchedLeaves': benchBatchedLeaves,
+    'evaluator': benchEvaluator,
+    'expectimax': benchExpectimax,
+    'layoutCopy': benchLayoutCopy,
+    'macroSearch': benchMacroSearch,
+    'manyGhosts': benchManyGhosts,
+    'mazeDistances': benchMazeDistances,
+    'parallelSearch': benchParallelSearch,
+    'searchDepth': benchSearchDepth,
+    'searchModes': benchSearchModes,
+    'stateMemory': benchStateMemory,
+}
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print 'Benchmarks:', ', '.join(sorted(BENCHMARKS))
+        sys.exit(1)
+    random.seed('cs188')
+    options = {}
+    for key, value in parseAgentArgs(','.join(sys.argv[2:]) or None).items():
+        for convert in (int, float, str):
+            try:
+                options[key] = convert(value)
+                break
+            except ValueError:
+                continue
+    BENCHMARKS[sys.argv[1]](**options)
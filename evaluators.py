@@ -0,0 +1,187 @@
+# evaluators.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+"Leaf evaluation functions for the search agents"
+
+import util
+import numpy as np
+from game import MoveTable
+
+class LeafBatch:
+    """
+    The leaves of a search, gathered one by one with add and then valued
+    all at once by an evaluator's evaluateBatch.  pack turns them into NumPy
+    arrays with a row per leaf, in the order they were added:
+
+      cells      the cell of every agent (leaves x agents)
+      scores     the game scores (leaves x agents)
+      finished   whether the game is over
+      foodIndex  the row of foods holding the leaf's food
+      foods      the food of the leaves as cell masks (food grids x cells)
+      foodLeft   the food left (food grids)
+
+    The leaves of one search share a few food grids, one per set of food
+    eaten on the way to them, so every food grid is stored once.
+    """
+    def __init__(self, state):
+        self.distances = state.getMazeDistances()
+        self.numCells = self.distances.numCells
+        self.numAgents = state.getNumAgents()
+        self.cellRows = []
+        self.scoreRows = []
+        self.finishedRows = []
+        self.foodRows = []
+        self.foodKinds = {}
+        self.foodGrids = []
+        self.size = 0
+
+    def add(self, state):
+        "Adds the state as a leaf and returns its row"
+        data = state.data
+        cells = []
+        for agentState in data.agentStates:
+            configuration = agentState.configuration
+            if configuration.index is None: cells.append(self.distances.getCell(configuration.pos))
+            else: cells.append(configuration.index >> MoveTable.CELL_SHIFT)
+        self.cellRows.append(cells)
+        self.scoreRows.append(list(data.scores))
+        self.finishedRows.append(data._pacDied or data._oppDied or data._gstLose)
+        kind = self.foodKinds.get(data.food.bits)
+        if kind is None:
+            kind = self.foodKinds[data.food.bits] = len(self.foodGrids)
+            self.foodGrids.append(data.food)
+        self.foodRows.append(kind)
+        self.size += 1
+        return self.size - 1
+
+    def pack(self):
+        "Builds the arrays from the leaves added so far"
+        self.cells = np.array(self.cellRows, dtype=np.intp).reshape(self.size, self.numAgents)
+        self.scores = np.array(self.scoreRows, dtype=float).reshape(self.size, self.numAgents)
+        self.finished = np.array(self.finishedRows, dtype=bool)
+        self.foodIndex = np.array(self.foodRows, dtype=np.intp)
+        self.foods = np.array([food.getMask() for food in self.foodGrids], dtype=bool).reshape(len(self.foodGrids), self.numCells)
+        self.foodLeft = np.array([food.numSet for food in self.foodGrids], dtype=float)
+
+class Evaluator:
+    """
+    Scores the leaves of a search.  The search agents pick one by name with
+    -a evaluator=...
+
+    scoresOnly is True for evaluators whose values are the game scores, which
+    the pruning that bounds how scores change (MultimaxAgent's shallow mode,
+    ExpectimaxAgent's star pruning) needs.
+
+    Evaluators that define evaluateBatch can also value a whole LeafBatch
+    in one vectorized call, which MultimaxAgent's batched mode relies on.
+    """
+    scoresOnly = False
+
+    def evaluate(self, state):
+        """
+          Returns the value of state for every agent, a list indexed like
+          state.getScores()
+        """
+        util.raiseNotDefined()
+
+    def evaluateBatch(self, batch):
+        """
+          Returns the values of every leaf of the LeafBatch, an array with
+          a row per leaf holding what evaluate would return for it
+        """
+        util.raiseNotDefined()
+
+class ScoreEvaluator(Evaluator):
+    "The game scores, which is what the search agents always used"
+    scoresOnly = True
+
+    def evaluate(self, state):
+        return state.getScores()
+
+    def evaluateBatch(self, batch):
+        batch.pack()
+        return batch.scores
+
+class MazeDistanceEvaluator(Evaluator):
+    """
+    The game scores adjusted with maze distances from the layout's
+    precomputed MazeDistances, so that a shallow search sees food and
+    danger past its horizon:
+
+    - Pacman and the opponent, while alive, lose FOOD_WEIGHT per step to
+      their nearest food, and GHOST_WEIGHT per step a ghost is inside
+      GHOST_RANGE steps of them
+    - every ghost loses CHASE_WEIGHT per step to the nearest living Pacman,
+      and gains FOOD_LEFT_WEIGHT per food left, since the ghosts lose when
+      the food runs out
+
+    Finished games are worth their scores.  Both Pacmen are alive in any
+    other game, which evaluateBatch relies on.
+    """
+    FOOD_WEIGHT = 1.0
+    GHOST_RANGE = 3
+    GHOST_WEIGHT = 50.0
+    CHASE_WEIGHT = 1.0
+    FOOD_LEFT_WEIGHT = 1.0
+
+    def evaluate(self, state):
+        values = state.getScores()
+        if state.isGhostWin() or state.isGhostLose(): return values
+        data = state.data
+        distances = state.getMazeDistances()
+        matrix = distances.getMatrix()
+        unreachable = distances.UNREACHABLE
+        agentStates = data.agentStates
+        pacmen = [i for i, dead in ((0, data._pacDied), (1, data._oppDied)) if not dead]
+        pacmanCells = [distances.getCell(agentStates[i].configuration.pos) for i in pacmen]
+        ghostCells = [distances.getCell(ghost.configuration.pos) for ghost in agentStates[2:]]
+        foodLeft = self.FOOD_LEFT_WEIGHT * data.food.numSet
+        food = None
+        if data.food.numSet: food = data.food.getMask()
+
+        for i, cell in zip(pacmen, pacmanCells):
+            row = matrix[cell]
+            if food is not None:
+                dist = row[food].min()
+                if dist != unreachable: values[i] -= self.FOOD_WEIGHT * int(dist)
+            for dist in row[ghostCells].tolist():
+                if dist < self.GHOST_RANGE:
+                    values[i] -= self.GHOST_WEIGHT * (self.GHOST_RANGE - dist)
+
+        for i, ghostCell in enumerate(ghostCells):
+            chase = matrix[ghostCell, pacmanCells].min() if pacmanCells else unreachable
+            if chase != unreachable: values[i + 2] -= self.CHASE_WEIGHT * int(chase)
+            values[i + 2] += foodLeft
+        return values
+
+    def evaluateBatch(self, batch):
+        batch.pack()
+        matrix = batch.distances.getMatrix()
+        unreachable = batch.distances.UNREACHABLE
+        values = batch.scores.copy()
+        pacmanCells = batch.cells[:, :2]
+        ghostCells = batch.cells[:, 2:]
+        foods = batch.foods[batch.foodIndex]
+
+        for i in range(2):
+            rows = matrix[pacmanCells[:, i]]
+            nearest = np.where(foods, rows, unreachable).min(axis=1)
+            values[:, i] -= self.FOOD_WEIGHT * np.where(nearest < unreachable, nearest, 0)
+            danger = self.GHOST_RANGE - matrix[pacmanCells[:, i:i + 1], ghostCells].astype(float)
+            values[:, i] -= self.GHOST_WEIGHT * np.maximum(danger, 0).sum(axis=1)
+
+        chase = np.minimum(matrix[ghostCells, pacmanCells[:, :1]], matrix[ghostCells, pacmanCells[:, 1:]])
+        values[:, 2:] -= self.CHASE_WEIGHT * np.where(chase < unreachable, chase, 0)
+        values[:, 2:] += self.FOOD_LEFT_WEIGHT * batch.foodLeft[batch.foodIndex][:, None]
+        values[batch.finished] = batch.scores[batch.finished]
+        return values
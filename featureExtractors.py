@@ -28,11 +28,19 @@ class IdentityExtractor(FeatureExtractor):
         feats[(state,action)] = 1.0
         return feats
 
-def closestFood(pos, food, walls):
+def closestFood(pos, food, walls, state=None):
     """
     closestFood -- this is similar to the function that we have
     worked on in the search project; here its all in one place
+
+    Given the state whose food and walls these are, it is one read of the
+    state's nearest-food field instead (see GameState.getFoodDistances)
     """
+    if state is not None:
+        distances = state.getMazeDistances()
+        nearest = state.getFoodDistances().item(distances.getCell(pos))
+        if nearest == distances.UNREACHABLE: return None
+        return nearest
     fringe = [(pos[0], pos[1], 0)]
     expanded = set()
     while fringe:
@@ -63,6 +71,7 @@ class SimpleExtractor(FeatureExtractor):
         # extract the grid of food and wall locations and get the ghost locations
         food = state.getFood()
         walls = state.getWalls()
+        moves = state.getMoveTable()
         ghosts = state.getGhostPositions()
 
         features = util.Counter()
@@ -75,13 +84,13 @@ class SimpleExtractor(FeatureExtractor):
         next_x, next_y = int(x + dx), int(y + dy)
 
         # count the number of ghosts 1-step away
-        features["#-of-ghosts-1-step-away"] = sum((next_x, next_y) in Actions.getLegalNeighbors(g, walls) for g in ghosts)
+        features["#-of-ghosts-1-step-away"] = sum((next_x, next_y) in moves.getLegalNeighbors(g) for g in ghosts)
 
         # if there is no danger of ghosts then add the food feature
         if not features["#-of-ghosts-1-step-away"] and food[next_x][next_y]:
             features["eats-food"] = 1.0
 
-        dist = closestFood((next_x, next_y), food, walls)
+        dist = closestFood((next_x, next_y), food, walls, state)
         if dist is not None:
             # make the distance a number less than one otherwise the update
             # will diverge wildly
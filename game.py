@@ -24,6 +24,9 @@ from util import *
 import time, os
 import traceback
 import sys
+import random
+import binascii
+import numpy as np
 
 #######################
 # Parts worth reading #
@@ -35,7 +38,24 @@ class Agent:
     following methods which will be called if they exist:
 
     def registerInitialState(self, state): # inspects the starting state
+    def setTimeBudget(self, moveTime, totalTime): # seconds left for the next
+        # move and for the rest of the game, called before each getAction
+    def registerAgents(self, agents): # the agents of the game, by index
+    def getNodeNum(self): # search nodes expanded so far, which Game adds up
+        # for Pacman in totalNodes
+    def getMoveStats(self): # telemetry of the last getAction, a dict with
+        # any of nodes, nodesByDepth (a list, the root's ply first),
+        # branching (effective branching factor), cutoffs, ttHits and depth
+        # (reached), or more; Game adds agent, move (the index in
+        # moveHistory) and time (seconds), and keeps it in moveStats;
+        # None for a move without telemetry
+
+    Agents whose moves are random should set the class attribute stochastic
+    to True and define getDistribution(state), the probabilities of their
+    actions, so that search agents can model them as chance nodes.
     """
+    stochastic = False
+
     def __init__(self, index):
         self.index = index
 
@@ -67,18 +87,39 @@ class Directions:
                WEST: EAST,
                STOP: STOP}
 
-class Configuration:
+class SlottedObject(object):
+    """
+    Base class for the compact engine objects that search creates by the
+    million.  Subclasses list their attributes in __slots__, so instances
+    have no per-instance __dict__.  Pickling is provided here because
+    __slots__ classes cannot otherwise be pickled with protocols 0 and 1.
+    """
+    __slots__ = ()
+
+    def __getstate__(self):
+        return tuple([getattr(self, name, None) for name in self.__slots__])
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+class Configuration(SlottedObject):
     """
     A Configuration holds the (x,y) coordinate of a character, along with its
     traveling direction.
 
     The convention for positions, like a graph, is that (0,0) is the lower left corner, x increases
     horizontally and y increases vertically.  Therefore, north is the direction of increasing y, or (0,1).
+
+    Configurations on grid points are interned per layout by its MoveTable;
+    those carry their index in the table, other configurations have None.
     """
+    __slots__ = ('pos', 'direction', 'index')
 
-    def __init__(self, pos, direction):
+    def __init__(self, pos, direction, index=None):
         self.pos = pos
         self.direction = direction
+        self.index = index
 
     def getPosition(self):
         return (self.pos)
@@ -91,6 +132,7 @@ class Configuration:
         return x == int(x) and y == int(y)
 
     def __eq__(self, other):
+        if self is other: return True
         if other == None: return False
         return (self.pos == other.pos and self.direction == other.direction)
 
@@ -117,10 +159,12 @@ class Configuration:
             direction = self.direction # There is no stop direction
         return Configuration((x + dx, y+dy), direction)
 
-class AgentState:
+class AgentState(SlottedObject):
     """
     AgentStates hold the state of an agent (configuration, speed, scared, etc).
     """
+    __slots__ = ('start', 'configuration', 'isPacman', 'isOpponent', 'scaredTimer',
+                 'numCarrying', 'numReturned')
 
     def __init__( self, startConfiguration, isPacman, isOpponent ):
         self.start = startConfiguration
@@ -277,6 +321,159 @@ class Grid:
                 bools.append(False)
         return bools
 
+class BitGrid(SlottedObject):
+    """
+    A boolean Grid backed by a single integer bitboard.  Cell (x,y) is stored
+    in bit x * height + y, the same cell ordering packBits uses, and the number
+    of set cells is maintained alongside the bits.  Since the bits are an
+    immutable integer, copy() is O(1) and count(), __eq__ and __hash__ never
+    walk the board.
+
+    Data is accessed via grid[x][y] exactly like a Grid; get, set and clear
+    are the direct (allocation free) equivalents.
+    """
+    __slots__ = ('width', 'height', 'bits', 'numSet')
+    def __init__(self, width, height, bits=0, numSet=None):
+        self.width = width
+        self.height = height
+        self.bits = bits
+        if numSet is None:
+            numSet = bin(bits).count('1')
+        self.numSet = numSet
+
+    def fromGrid(grid):
+        """
+        Builds a BitGrid holding the same cells as a list-backed Grid.
+        """
+        bits = 0
+        for x, y in grid.asList():
+            bits |= 1 << (x * grid.height + y)
+        return BitGrid(grid.width, grid.height, bits)
+    fromGrid = staticmethod(fromGrid)
+
+    def toGrid(self):
+        g = Grid(self.width, self.height)
+        for x, y in self.asList():
+            g[x][y] = True
+        return g
+
+    def get(self, x, y):
+        return (self.bits >> (x * self.height + y)) & 1 == 1
+
+    def getCells(self):
+        "The cell indices (x * height + y) of the set cells, in increasing order"
+        cells = []
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            cells.append(low.bit_length() - 1)
+            bits ^= low
+        return cells
+
+    def getMask(self):
+        "The cells as a NumPy boolean array indexed by cell (x * height + y)"
+        size = self.width * self.height
+        # The bits as big-endian bytes, unpacked and reversed to cell order
+        numBytes = (size + 7) // 8
+        text = binascii.unhexlify('%0*x' % (2 * numBytes, self.bits))
+        return np.unpackbits(np.frombuffer(text, dtype=np.uint8))[::-1][:size].astype(bool)
+
+    def hasCell(self, cell):
+        "Like get, for the cell index x * height + y"
+        return (self.bits >> cell) & 1 == 1
+
+    def clearCell(self, cell):
+        "Like clear, for the cell index x * height + y"
+        bit = 1 << cell
+        if self.bits & bit:
+            self.bits ^= bit
+            self.numSet -= 1
+
+    def set(self, x, y, value):
+        if value: self.fill(x, y)
+        else: self.clear(x, y)
+
+    def fill(self, x, y):
+        bit = 1 << (x * self.height + y)
+        if not self.bits & bit:
+            self.bits |= bit
+            self.numSet += 1
+
+    def clear(self, x, y):
+        bit = 1 << (x * self.height + y)
+        if self.bits & bit:
+            self.bits ^= bit
+            self.numSet -= 1
+
+    def __getitem__(self, x):
+        if x < 0 or x >= self.width: raise IndexError('BitGrid column out of range')
+        return _BitGridColumn(self, x)
+
+    def __str__(self):
+        out = [[str(self.get(x, y))[0] for x in range(self.width)] for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if other == None: return False
+        if isinstance(other, BitGrid):
+            return self.bits == other.bits and self.width == other.width
+        return self.asList() == other.asList()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def copy(self):
+        return BitGrid(self.width, self.height, self.bits, self.numSet)
+
+    def deepCopy(self):
+        return self.copy()
+
+    def shallowCopy(self):
+        # The bits are immutable, so sharing them is already a full copy
+        return self.copy()
+
+    def count(self, item=True):
+        if item: return self.numSet
+        return self.width * self.height - self.numSet
+
+    def asList(self, key=True):
+        if not key:
+            return self.toGrid().asList(False)
+        list = []
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            index = low.bit_length() - 1
+            list.append((index // self.height, index % self.height))
+            bits ^= low
+        return list
+
+    def packBits(self):
+        return self.toGrid().packBits()
+
+class _BitGridColumn(SlottedObject):
+    """
+    The grid[x] view of a BitGrid, so that grid[x][y] reads and writes bits.
+    """
+    __slots__ = ('grid', 'x')
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.x = x
+
+    def __getitem__(self, y):
+        if y < 0 or y >= self.grid.height: raise IndexError('BitGrid row out of range')
+        return self.grid.get(self.x, y)
+
+    def __setitem__(self, y, value):
+        self.grid.set(self.x, y, value)
+
+    def __len__(self):
+        return self.grid.height
+
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1,2)):
         return bitRep
@@ -300,8 +497,28 @@ class Actions:
 
     _directionsAsList = _directions.items()
 
+    # The engine's internal representation of actions: small integer codes,
+    # with lookup tables indexed by code.  Agents keep using the strings;
+    # the rules convert once, when an action enters the engine.
+    _codeToDirection = (Directions.NORTH,
+                        Directions.SOUTH,
+                        Directions.EAST,
+                        Directions.WEST,
+                        Directions.STOP)
+    _directionCodes = dict([(direction, code) for code, direction in enumerate(_codeToDirection)])
+    _reverseCodes = (1, 0, 3, 2, 4)
+    STOP_CODE = 4
+
     TOLERANCE = .001
 
+    def directionToCode(direction):
+        return Actions._directionCodes[direction]
+    directionToCode = staticmethod(directionToCode)
+
+    def codeToDirection(code):
+        return Actions._codeToDirection[code]
+    codeToDirection = staticmethod(codeToDirection)
+
     def reverseDirection(action):
         if action == Directions.NORTH:
             return Directions.SOUTH
@@ -371,10 +588,480 @@ class Actions:
         return (x + dx, y + dy)
     getSuccessor = staticmethod(getSuccessor)
 
-class GameStateData:
+class MoveTable:
+    """
+    The moves of a board, computed once from its walls (see
+    Layout.getMoveTable), in the engine's integer representation: cells are
+    indexed x * height + y like a BitGrid, and actions by their code (see
+    Actions.directionToCode).
+
+    It interns one Configuration per open cell and direction, whose index is
+    cell << CELL_SHIFT | direction code.  By cell it holds the possible
+    actions and the neighboring open cells, and by configuration index the
+    ghost actions (which depend on the arrival direction) and the successor
+    configuration for every action code.  So moving, legality checks and
+    move generation are all list lookups.  The string and tuple lookups give
+    the same results, in the same order, as Actions.getPossibleActions,
+    Actions.getLegalNeighbors and GhostRules.getLegalActions.
     """
+    CELL_SHIFT = 3
+
+    def __init__(self, walls):
+        self.width = walls.width
+        self.height = walls.height
+        self.actions = []
+        self.actionMasks = []
+        self.neighbors = []
+        self.neighborCells = []
+        for x in range(self.width):
+            for y in range(self.height):
+                possible = []
+                neighbors = []
+                for dir, vec in Actions._directionsAsList:
+                    dx, dy = vec
+                    next_x, next_y = x + dx, y + dy
+                    if next_x < 0 or next_x == self.width: continue
+                    if next_y < 0 or next_y == self.height: continue
+                    if not walls[next_x][next_y]:
+                        possible.append(dir)
+                        neighbors.append((next_x, next_y))
+                self.actions.append(tuple(possible))
+                self.actionMasks.append(MoveTable._mask(possible))
+                self.neighbors.append(tuple(neighbors))
+                self.neighborCells.append(tuple([nx * self.height + ny for nx, ny in neighbors]))
+
+        size = (self.width * self.height) << MoveTable.CELL_SHIFT
+        self.configurations = [None] * size
+        self.ghostActions = [None] * size
+        self.ghostMasks = [0] * size
+        for x in range(self.width):
+            for y in range(self.height):
+                if walls[x][y]: continue
+                cell = x * self.height + y
+                for code, dir in enumerate(Actions._codeToDirection):
+                    index = cell << MoveTable.CELL_SHIFT | code
+                    self.configurations[index] = Configuration((x, y), dir, index)
+                    ghostActions = MoveTable._ghostActions(self.actions[cell], dir)
+                    self.ghostActions[index] = ghostActions
+                    self.ghostMasks[index] = MoveTable._mask(ghostActions)
+
+        self.successors = [None] * size
+        for config in self.configurations:
+            if config == None: continue
+            successors = [None] * len(Actions._codeToDirection)
+            for code, dir in enumerate(Actions._codeToDirection):
+                if code == Actions.STOP_CODE:
+                    successors[code] = config # There is no stop direction
+                else:
+                    successor = self.intern(Actions.getSuccessor(config.pos, dir), dir)
+                    if successor.index != None: successors[code] = successor
+            self.successors[config.index] = tuple(successors)
+
+    def _mask(actions):
+        mask = 0
+        for action in actions:
+            mask |= 1 << Actions._directionCodes[action]
+        return mask
+    _mask = staticmethod(_mask)
+
+    def _ghostActions(possible, direction):
+        # Ghosts cannot stop, and cannot turn around unless at a dead end
+        possible = [dir for dir in possible if dir != Directions.STOP]
+        reverse = Actions.reverseDirection(direction)
+        if reverse in possible and len(possible) > 1:
+            possible.remove(reverse)
+        return tuple(possible)
+    _ghostActions = staticmethod(_ghostActions)
+
+    def getCell(self, config):
+        """
+        Returns the cell index of an interned configuration, else None.
+        """
+        if config.index == None: return None
+        return config.index >> MoveTable.CELL_SHIFT
 
+    def getPossibleActions(self, config):
+        if config.index != None:
+            return self.actions[config.index >> MoveTable.CELL_SHIFT]
+        x, y = config.pos
+        x_int, y_int = int(x + 0.5), int(y + 0.5)
+
+        # In between grid points, all agents must continue straight
+        if (abs(x - x_int) + abs(y - y_int)  > Actions.TOLERANCE):
+            return (config.direction,)
+        return self.actions[x_int * self.height + y_int]
+
+    def getGhostActions(self, config):
+        if config.index != None:
+            return self.ghostActions[config.index]
+        x, y = config.pos
+        x_int, y_int = int(x + 0.5), int(y + 0.5)
+        if (abs(x - x_int) + abs(y - y_int)  > Actions.TOLERANCE):
+            return MoveTable._ghostActions([config.direction], config.direction)
+        return MoveTable._ghostActions(self.actions[x_int * self.height + y_int], config.direction)
+
+    def canMove(self, config, code):
+        "Whether the action code is possible from config"
+        if config.index != None:
+            return (self.actionMasks[config.index >> MoveTable.CELL_SHIFT] >> code) & 1 == 1
+        return Actions._codeToDirection[code] in self.getPossibleActions(config)
+
+    def canGhostMove(self, config, code):
+        "Whether the action code is a legal ghost move from config"
+        if config.index != None:
+            return (self.ghostMasks[config.index] >> code) & 1 == 1
+        return Actions._codeToDirection[code] in self.getGhostActions(config)
+
+    def getLegalNeighbors(self, position):
+        x, y = position
+        return self.neighbors[int(x + 0.5) * self.height + int(y + 0.5)]
+
+    def intern(self, pos, direction):
+        """
+        Returns the shared Configuration for an open grid point, or a new one
+        for positions the table does not hold (between grid points or in a
+        wall).
+        """
+        x, y = pos
+        if x == int(x) and y == int(y) and 0 <= x < self.width and 0 <= y < self.height:
+            cell = int(x) * self.height + int(y)
+            config = self.configurations[cell << MoveTable.CELL_SHIFT | Actions._directionCodes[direction]]
+            if config != None: return config
+        return Configuration(pos, direction)
+
+    def getSuccessor(self, config, code, speed=1.0):
+        """
+        Returns the configuration reached by moving config by the action code
+        at speed, like config.generateSuccessor.  Whole steps from interned
+        configurations are looked up; fractional moves (half speed ghosts)
+        are computed, and interned again once they land on a grid point.
+        """
+        if config.index != None and speed == 1:
+            successor = self.successors[config.index][code]
+            if successor != None: return successor
+        vector = Actions.directionToVector(Actions._codeToDirection[code], speed)
+        successor = config.generateSuccessor(vector)
+        return self.intern(successor.pos, successor.direction)
+
+class MazeDistances:
+    """
+    The maze distance between every pair of cells of a board, found once by
+    a breadth first search from every open cell over a MoveTable (see
+    Layout.getMazeDistances, which shares them between all the boards with
+    the same walls).  They are kept in a cells x cells int16 NumPy array
+    indexed like the MoveTable's cells, 2 bytes a pair, with UNREACHABLE for
+    walls and cells with no path between them:
+
+      distance(a, b)       the distance from cell a to cell b, or None
+      distances(a, cells)  the distances from a to a list, array or mask of
+                           cells, as an int16 array
+      getMatrix()          the whole array, for evaluating many positions
+                           at once; getMatrix()[a] is a's row, a view
+
+    nearest(cells) gives the distance from every cell to the nearest of a
+    set of cells, such as the food, and updateNearest repairs that field
+    after cells leave or join the set (see GameState.getFoodDistances).
+    """
+    UNREACHABLE = int(np.iinfo(np.int16).max)
+
+    def __init__(self, moves):
+        self.height = moves.height
+        self.numCells = moves.width * moves.height
+        self.matrix = np.full((self.numCells, self.numCells), MazeDistances.UNREACHABLE, dtype=np.int16)
+        for source in range(self.numCells):
+            if moves.configurations[source << MoveTable.CELL_SHIFT] == None: continue
+            reached = {source: 0}
+            frontier = [source]
+            dist = 0
+            while frontier:
+                dist += 1
+                next = []
+                for cell in frontier:
+                    for neighbor in moves.neighborCells[cell]:
+                        if neighbor not in reached:
+                            reached[neighbor] = dist
+                            next.append(neighbor)
+                frontier = next
+            self.matrix[source, reached.keys()] = reached.values()
+
+    def getCell(self, pos):
+        "The cell index of the grid point nearest to pos"
+        x, y = pos
+        return int(x + 0.5) * self.height + int(y + 0.5)
+
+    def distance(self, a, b):
+        "The distance from cell a to cell b, or None"
+        dist = self.matrix.item(a, b)
+        if dist == MazeDistances.UNREACHABLE: return None
+        return dist
+
+    def distances(self, a, cells):
+        """
+        The distances from cell a to the cells, a list or array of cells or
+        a boolean mask of them (see BitGrid.getMask), as an int16 array
+        """
+        return self.matrix[a, cells]
+
+    def nearest(self, cells):
+        """
+        The distance from every cell to the nearest of the cells (a list,
+        array or mask), an int16 array with UNREACHABLE where there is none
+        """
+        columns = self.matrix[:, cells]
+        if columns.shape[1] == 0:
+            return np.full(self.numCells, MazeDistances.UNREACHABLE, dtype=np.int16)
+        return columns.min(axis=1)
+
+    def updateNearest(self, field, oldCells, newCells):
+        """
+        Turns field, the nearest distances to the set cells of the BitGrid
+        oldCells, into those for newCells.  Only the cells whose nearest
+        cell was cleared are searched again, and cells that were set can
+        only bring the nearest closer.  Returns a new array.
+        """
+        field = field.copy()
+        removed = BitGrid(oldCells.width, oldCells.height, oldCells.bits & ~newCells.bits).getCells()
+        if removed:
+            affected = (self.matrix[:, removed] == field[:, None]).any(axis=1)
+            affected &= field != MazeDistances.UNREACHABLE
+            if affected.any():
+                rows = self.matrix[affected][:, newCells.getMask()]
+                field[affected] = rows.min(axis=1, initial=MazeDistances.UNREACHABLE)
+        added = BitGrid(oldCells.width, oldCells.height, newCells.bits & ~oldCells.bits).getCells()
+        if added:
+            field = np.minimum(field, self.nearest(added))
+        return field
+
+    def getDistance(self, pos1, pos2):
+        return self.distance(self.getCell(pos1), self.getCell(pos2))
+
+    def getMatrix(self):
+        return self.matrix
+
+class FoodDistances(object):
+    """
+    The nearest-food distance fields of the states of one game (see
+    GameState.getFoodDistances): get(food) is the maze distance from every
+    cell to the nearest set cell of the BitGrid food.  The field of the
+    starting food comes from the layout, computed once per layout, and
+    every other field is repaired from the last one made rather than
+    computed afresh (see MazeDistances.updateNearest), which between the
+    states of a game means a pellet or two.  The fields of the last
+    CAPACITY food grids are kept, so a state asked again, or one whose
+    food is unchanged, is answered by a dict lookup.
+    """
+    CAPACITY = 8
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.last = None
+        self.fields = {}
+        self.order = []
+
+    def __reduce__(self):
+        # The fields can be rebuilt from the layout, so a pickled state
+        # carries an empty cache
+        return (FoodDistances, (self.layout,))
+
+    def get(self, food):
+        distances = self.fields.get(food.bits)
+        if distances is not None: return distances
+        if self.last is None:
+            self.last = self.layout.getFoodDistances()
+        lastFood, distances = self.last
+        if lastFood.bits != food.bits:
+            distances = self.layout.getMazeDistances().updateNearest(distances, lastFood, food)
+            distances.flags.writeable = False
+            self.last = (food.copy(), distances)
+        self.fields[food.bits] = distances
+        self.order.append(food.bits)
+        if len(self.order) > FoodDistances.CAPACITY:
+            del self.fields[self.order.pop(0)]
+        return distances
+
+class Corridor(SlottedObject):
+    """
+    A path of a JunctionGraph from the junction start to the junction end
+    (start again for a loop) through cells with exactly two open neighbors.
+    cells lists the cells entered along the way, end included, and actions
+    the moves entering them; foodMask has the bits of those cells in a food
+    BitGrid.
     """
+    __slots__ = ('start', 'end', 'cells', 'actions', 'length', 'foodMask')
+    def __init__(self, start, cells, actions):
+        self.start = start
+        self.end = cells[-1]
+        self.cells = cells
+        self.actions = actions
+        self.length = len(cells)
+        self.foodMask = 0
+        for cell in cells:
+            self.foodMask |= 1 << cell
+
+    def countFood(self, food):
+        "The food of the BitGrid along the corridor"
+        return bin(food.bits & self.foodMask).count('1')
+
+class JunctionGraph:
+    """
+    The board compressed to its junctions, the open cells that do not have
+    exactly two open neighbors (crossings and dead ends), joined by the
+    Corridors between them.  A loop of corridor cells without any junction
+    gets one of its cells as a junction.  Built once per board from its
+    MoveTable (see Layout.getJunctionGraph), with cells indexed like the
+    MoveTable's.
+
+    getRoutes(cell) lists the ways to the next junction: the corridors
+    leaving a junction, or from a corridor cell, the rest of the two
+    corridors through it.
+    """
+    def __init__(self, moves):
+        self.height = moves.height
+        size = moves.width * moves.height
+        self.degree = [0] * size
+        for cell in range(size):
+            if moves.configurations[cell << MoveTable.CELL_SHIFT] != None:
+                self.degree[cell] = len([a for a in moves.actions[cell] if a != Directions.STOP])
+        self.junction = [degree > 0 and degree != 2 for degree in self.degree]
+        self.corridors = [()] * size
+        self.passing = [[] for cell in range(size)]
+        for cell in range(size):
+            if self.junction[cell]: self.addCorridors(moves, cell)
+        for cell in range(size):
+            if self.degree[cell] == 2 and not self.junction[cell] and not self.passing[cell]:
+                self.junction[cell] = True
+                self.addCorridors(moves, cell)
+
+    def addCorridors(self, moves, start):
+        corridors = []
+        for action in moves.actions[start]:
+            if action == Directions.STOP: continue
+            cells, actions = [], []
+            cell = start
+            while True:
+                dx, dy = Actions._directions[action]
+                cell += dx * self.height + dy
+                cells.append(cell)
+                actions.append(action)
+                if self.junction[cell]: break
+                reverse = Actions.reverseDirection(action)
+                action = [a for a in moves.actions[cell] if a != Directions.STOP and a != reverse][0]
+            corridor = Corridor(start, tuple(cells), tuple(actions))
+            for offset, cell in enumerate(cells[:-1]):
+                self.passing[cell].append((corridor, offset))
+            corridors.append(corridor)
+        self.corridors[start] = tuple(corridors)
+
+    def isJunction(self, cell):
+        return self.junction[cell]
+
+    def getRoutes(self, cell):
+        """
+        Returns (actions, cells) for every way from cell to the next
+        junction, like a Corridor's actions and cells.
+        """
+        if self.junction[cell]:
+            return [(corridor.actions, corridor.cells) for corridor in self.corridors[cell]]
+        return [(corridor.actions[offset + 1:], corridor.cells[offset + 1:])
+                for corridor, offset in self.passing[cell]]
+
+    def getNumJunctions(self):
+        return len([cell for cell in range(len(self.junction)) if self.junction[cell]])
+
+class ZobristKeys(object):
+    """
+    Random 64-bit keys used to hash a GameStateData incrementally.  There is a
+    key for every food cell and, per agent, for every (cell, direction) an
+    agent can stand in, laid out like the MoveTable configuration indices.
+    Scores are unbounded, so they are hashed by mixing the score with a
+    per-agent salt instead of a table lookup, and memoized since a game only
+    visits a narrow range of scores.
+
+    The keys come from a fixed seed, so equal states hash equally in every
+    process.  Use getZobristKeys to share one table per board size.
+    """
+    SEED = 188
+    MASK = (1 << 64) - 1
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.random = random.Random(ZobristKeys.SEED)
+        self.food = [self.random.getrandbits(64) for i in range(width * height)]
+        self.agents = []
+        self.salts = []
+        self.scoreKeys = []
+
+    def __reduce__(self):
+        # The keys are a function of the board size, so send just that
+        return (getZobristKeys, (self.width, self.height))
+
+    def _addAgents(self, numAgents):
+        # Agents are added in index order, so the keys stay reproducible
+        size = (self.width * self.height) << MoveTable.CELL_SHIFT
+        while len(self.agents) < numAgents:
+            self.agents.append([self.random.getrandbits(64) for i in range(size)])
+            self.salts.append(self.random.getrandbits(64))
+            self.scoreKeys.append({})
+
+    def configurationKey(self, agentIndex, configuration):
+        if agentIndex >= len(self.agents): self._addAgents(agentIndex + 1)
+        if configuration.index != None:
+            return self.agents[agentIndex][configuration.index]
+        x, y = configuration.pos
+        if x == int(x) and y == int(y):
+            cell = int(x) * self.height + int(y)
+            return self.agents[agentIndex][cell << MoveTable.CELL_SHIFT | Actions._directionCodes[configuration.direction]]
+        # Fractional positions (half speed ghosts) are not in the table
+        return mix64(hash((x, y, configuration.direction)) ^ self.salts[agentIndex])
+
+    def foodKey(self, x, y):
+        return self.food[x * self.height + y]
+
+    def scoreKey(self, agentIndex, score):
+        if agentIndex >= len(self.salts): self._addAgents(agentIndex + 1)
+        keys = self.scoreKeys[agentIndex]
+        key = keys.get(score)
+        if key is None:
+            key = keys[score] = mix64(int(score) ^ self.salts[agentIndex])
+        return key
+
+def mix64(z):
+    """
+    The splitmix64 finalizer: scrambles an integer into 64 well mixed bits.
+    """
+    z = (z + 0x9E3779B97F4A7C15) & ZobristKeys.MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & ZobristKeys.MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & ZobristKeys.MASK
+    return z ^ (z >> 31)
+
+_ZOBRIST_KEYS = {}
+def getZobristKeys(width, height):
+    if (width, height) not in _ZOBRIST_KEYS:
+        _ZOBRIST_KEYS[(width, height)] = ZobristKeys(width, height)
+    return _ZOBRIST_KEYS[(width, height)]
+
+def ghostCell( configuration ):
+    "The key of a ghost's configuration in GameStateData's occupancy index"
+    if configuration.index == None: return None
+    return configuration.index >> MoveTable.CELL_SHIFT
+
+class GameStateData(SlottedObject):
+    """
+    The data behind a GameState: food, agent states, scores, the flags set by
+    the last move and the state's Zobrist hash.
+
+    _ghostCells is an occupancy index of the ghosts (every agent from index
+    2): how many ghosts stand on each cell, by MoveTable cell index, with
+    None counting ghosts off the grid points.  Cells without ghosts have no
+    entry, so whether a move runs into any ghost is one dict lookup.
+
+    _foodDistances holds the nearest-food distance fields of the game, a
+    FoodDistances that every copy and successor of the initial state shares.
+    """
+    __slots__ = ('food', 'agentStates', 'layout', 'scores', 'scoreChange', '_keys', '_hash',
+                 '_foodEaten', '_foodAdded', '_agentMoved', '_pacDied', '_oppDied', '_gstLose',
+                 '_ghostCells', '_foodDistances')
     def __init__( self, prevState = None ):
         """
         Generates a new data packet by copying information from its predecessor.
@@ -386,6 +1073,14 @@ class GameStateData:
             self.layout = prevState.layout
             # self._eaten = prevState._eaten
             self.scores = prevState.scores[:]
+            self._keys = prevState._keys
+            self._hash = prevState._hash
+            self._ghostCells = prevState._ghostCells.copy()
+            self._foodDistances = prevState._foodDistances
+            self.scoreChange = [0] * len( self.agentStates )
+        else:
+            self.scoreChange = []
+            self._foodDistances = None
 
         self._foodEaten = None
         self._foodAdded = None
@@ -393,18 +1088,26 @@ class GameStateData:
         self._pacDied = False #pacman is died
         self._oppDied = False #opponent is died
         self._gstLose = False #no foods
-        self.scoreChange = [0, 0, 0]
 
 
     def deepCopy( self ):
         state = GameStateData( self )
         state.food = self.food.deepCopy()
-        state.layout = self.layout.deepCopy()
+        # The layout is immutable and shared (see layout.Layout)
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
         state._foodAdded = self._foodAdded
         return state
 
+    def moveGhost( self, oldConfiguration, newConfiguration ):
+        "Updates the ghost occupancy index after a ghost moved"
+        cells = self._ghostCells
+        old = ghostCell( oldConfiguration )
+        if cells[old] == 1: del cells[old]
+        else: cells[old] -= 1
+        new = ghostCell( newConfiguration )
+        cells[new] = cells.get( new, 0 ) + 1
+
     def copyAgentStates( self, agentStates ):
         copiedStates = []
         for agentState in agentStates:
@@ -417,6 +1120,7 @@ class GameStateData:
         """
         if other == None: return False
         # TODO Check for type of other
+        if self._hash != other._hash: return False
         if not self.agentStates == other.agentStates: return False
         if not self.food == other.food: return False
         if not self.scores == other.scores: return False
@@ -424,15 +1128,57 @@ class GameStateData:
 
     def __hash__( self ):
         """
-        Allows states to be keys of dictionaries.
+        Allows states to be keys of dictionaries.  The 64-bit Zobrist hash is
+        maintained by updateHash, so this is O(1).
         """
-        for i, state in enumerate( self.agentStates ):
-            try:
-                int(hash(state))
-            except TypeError, e:
-                print e
-                #hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 7 * hash(tuple(self.scores))) % 1048575 )
+        return self._hash
+
+    def computeHash( self ):
+        """
+        Computes the Zobrist hash from scratch: the XOR of the keys of every
+        agent configuration, every remaining pellet and every score.
+        """
+        keys = self._keys
+        h = 0
+        for agentIndex, agentState in enumerate( self.agentStates ):
+            h ^= keys.configurationKey( agentIndex, agentState.configuration )
+        for x, y in self.food.asList():
+            h ^= keys.foodKey( x, y )
+        for agentIndex, score in enumerate( self.scores ):
+            h ^= keys.scoreKey( agentIndex, score )
+        return h
+
+    def positionHash( self ):
+        """
+        The hash without the scores, equal for states that only differ in
+        their scores.  The rules never look at the scores, so such states
+        have the same future, up to the points already scored.
+        """
+        keys = self._keys
+        h = self._hash
+        for agentIndex, score in enumerate( self.scores ):
+            h ^= keys.scoreKey( agentIndex, score )
+        return h
+
+    def updateHash( self, agentIndex, oldConfiguration ):
+        """
+        Updates the hash after agentIndex moved from oldConfiguration and
+        scoreChange was added to the scores: the agent's old configuration,
+        the eaten pellet and the old values of the changed scores are XORed
+        out and the new ones XORed in.
+        """
+        keys = self._keys
+        h = self._hash
+        newConfiguration = self.agentStates[agentIndex].configuration
+        if oldConfiguration is not newConfiguration:
+            h ^= keys.configurationKey( agentIndex, oldConfiguration )
+            h ^= keys.configurationKey( agentIndex, newConfiguration )
+        if self._foodEaten != None:
+            h ^= keys.foodKey( *self._foodEaten )
+        for i, change in enumerate( self.scoreChange ):
+            if change:
+                h ^= keys.scoreKey( i, self.scores[i] - change ) ^ keys.scoreKey( i, self.scores[i] )
+        self._hash = h
 
     def __str__( self ):
         width, height = self.layout.width, self.layout.height
@@ -488,18 +1234,26 @@ class GameStateData:
         """
         Creates an initial game state from a layout array (see layout.py).
         """
-        self.food = layout.food.copy()
+        self.food = BitGrid.fromGrid(layout.food)
         self.layout = layout
         self.agentStates = []
+        moves = layout.getMoveTable()
         numGhosts = 0
         for isPacman, isOpponent, pos in layout.agentPositions:
             if not isPacman and not isOpponent:
                 if numGhosts == numGhostAgents: continue # Max ghosts reached already
                 else: numGhosts += 1                
-            self.agentStates.append( AgentState( Configuration( pos, Directions.STOP), isPacman, isOpponent) )
+            self.agentStates.append( AgentState( moves.intern( pos, Directions.STOP), isPacman, isOpponent) )
         # self._eaten = [False for a in self.agentStates]
         self.scores = [0] * len(self.agentStates)
         self.scoreChange = [0] * len(self.agentStates)
+        self._ghostCells = {}
+        for agentState in self.agentStates[2:]:
+            cell = ghostCell( agentState.configuration )
+            self._ghostCells[cell] = self._ghostCells.get( cell, 0 ) + 1
+        self._keys = getZobristKeys( layout.width, layout.height )
+        self._hash = self.computeHash()
+        self._foodDistances = FoodDistances(layout)
 
 try:
     import boinc
@@ -525,6 +1279,7 @@ class Game:
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
         self.totalNodes = 0
+        self.moveStats = []
         self.agentTimeout = False
         import cStringIO
         self.agentOutput = [cStringIO.StringIO() for agent in agents]
@@ -562,6 +1317,16 @@ class Game:
         sys.stderr = OLD_STDERR
 
 
+    def recordMove(self, agentIndex, agent, seconds, nodesBefore):
+        "Collects the telemetry of the move agent just chose (see Agent)"
+        if nodesBefore is not None:
+            self.totalNodes += agent.getNodeNum() - nodesBefore
+        if 'getMoveStats' in dir(agent):
+            stats = agent.getMoveStats()
+            if stats is None: return
+            stats.update(agent=agentIndex, move=len(self.moveHistory), time=seconds)
+            self.moveStats.append(stats)
+
     def run( self ):
         """
         Main control loop for game play.
@@ -570,6 +1335,11 @@ class Game:
         self.numMoves = 0
 
         ###self.display.initialize(self.state.makeObservation(1).data)
+        # tell search agents who they play with
+        for agent in self.agents:
+            if agent and 'registerAgents' in dir(agent):
+                agent.registerAgents(self.agents)
+
         # inform learning agents of the game start
         for i in range(len(self.agents)):
             agent = self.agents[i]
@@ -639,6 +1409,11 @@ class Game:
 
             # Solicit an action
             action = None
+            nodesBefore = None
+            if agentIndex == 0 and 'getNodeNum' in dir(agent): nodesBefore = agent.getNodeNum()
+            if 'setTimeBudget' in dir( agent ):
+                agent.setTimeBudget( self.rules.getMoveTimeout( agentIndex ) - move_time,
+                                     self.rules.getMaxTotalTime( agentIndex ) - self.totalAgentTimes[agentIndex] - move_time )
             self.mute(agentIndex)
             if self.catchExceptions:
                 try:
@@ -655,7 +1430,9 @@ class Game:
                         self.unmute()
                         return
 
-                    move_time += time.time() - start_time
+                    action_time = time.time() - start_time
+                    move_time += action_time
+                    self.recordMove(agentIndex, agent, action_time, nodesBefore)
 
                     if move_time > self.rules.getMoveWarningTime(agentIndex):
                         self.totalAgentTimeWarnings[agentIndex] += 1
@@ -681,11 +1458,11 @@ class Game:
                     self.unmute()
                     return
             else:
-                if agentIndex == 0: nodes_before = agent.getNodeNum()
+                start_time = time.time()
                 action = agent.getAction(observation)
-                if agentIndex == 0: 
-                    nodes_after = agent.getNodeNum()
-                    self.totalNodes += nodes_after - nodes_before
+                action_time = time.time() - start_time
+                self.totalAgentTimes[agentIndex] += action_time
+                self.recordMove(agentIndex, agent, action_time, nodesBefore)
                 self.unmute()
 
             # Execute the action
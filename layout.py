@@ -13,18 +13,28 @@
 
 
 from util import manhattanDistance
-from game import Grid
+from game import Grid, BitGrid, MoveTable, MazeDistances, JunctionGraph
 import os
 import random
 
 VISIBILITY_MATRIX_CACHE = {}
+LAYOUT_CACHE = {}
+MAZE_DISTANCES_CACHE = {}
 
-class Layout:
+class Layout(object):
     """
     A Layout manages the static information about the game board.
+
+    Layouts are treated as frozen: every GameState of a game shares the same
+    Layout, and layouts loaded through getLayout are shared between games with
+    the same maze text.  Code that really needs to edit a board should work
+    on mutableCopy() rather than changing a shared Layout in place.
     """
 
-    def __init__(self, layoutText):
+    def __init__(self, layoutText=None):
+        # No text when unpickling a game recorded before Layout pickled as
+        # its text; __setstate__ then builds it
+        if layoutText is None: return
         self.width = len(layoutText[0])
         self.height= len(layoutText)
         self.walls = Grid(self.width, self.height, False)
@@ -35,11 +45,66 @@ class Layout:
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
+        self.moveTable = None
+        self.mazeDistances = None
+        self.foodDistances = None
+        self.junctionGraph = None
         # self.initializeVisibilityMatrix()
 
+    def __reduce__(self):
+        # Pickles as its maze text, so a process receiving a state shares the
+        # Layout and MoveTable it already has (or builds them once)
+        return (internLayout, (self.layoutText,))
+
+    def __setstate__(self, state):
+        # Games recorded earlier pickled the Layout's attributes; rebuild it
+        # from the maze text so that it has everything it has today
+        self.__init__(state['layoutText'])
+
     def getNumGhosts(self):
         return self.numGhosts
 
+    def getMoveTable(self):
+        """
+        Returns the MoveTable of this board, building it on first use.
+        """
+        if self.moveTable is None:
+            self.moveTable = MoveTable(self.walls)
+        return self.moveTable
+
+    def getMazeDistances(self):
+        """
+        Returns the MazeDistances of this board, building them on first use.
+        Every layout with the same walls in the process shares them.
+        """
+        if self.mazeDistances is None:
+            key = str(self.walls)
+            if key not in MAZE_DISTANCES_CACHE:
+                MAZE_DISTANCES_CACHE[key] = MazeDistances(self.getMoveTable())
+            self.mazeDistances = MAZE_DISTANCES_CACHE[key]
+        return self.mazeDistances
+
+    def getFoodDistances(self):
+        """
+        Returns (food, distances) for the starting food of this board: the
+        food as a BitGrid, and the maze distance from every cell to the
+        nearest of it (see MazeDistances.nearest), computed on first use.
+        """
+        if self.foodDistances is None:
+            food = BitGrid.fromGrid(self.food)
+            distances = self.getMazeDistances().nearest(food.getMask())
+            distances.flags.writeable = False
+            self.foodDistances = (food, distances)
+        return self.foodDistances
+
+    def getJunctionGraph(self):
+        """
+        Returns the JunctionGraph of this board, building it on first use.
+        """
+        if self.junctionGraph is None:
+            self.junctionGraph = JunctionGraph(self.getMoveTable())
+        return self.junctionGraph
+
     def initializeVisibilityMatrix(self):
         global VISIBILITY_MATRIX_CACHE
         if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
@@ -90,6 +155,15 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
+        """
+        Layouts are immutable and shared, so a deep copy is the layout itself.
+        """
+        return self
+
+    def mutableCopy(self):
+        """
+        Returns a private, re-parsed Layout that may be modified freely.
+        """
         return Layout(self.layoutText[:])
 
     def processLayoutText(self, layoutText):
@@ -146,8 +220,18 @@ def getLayout(name, back = 2):
         os.chdir(curdir)
     return layout
 
+def internLayout(layoutText):
+    """
+    Returns the shared Layout for this maze text, parsing it only the first
+    time that text is seen.
+    """
+    key = '\n'.join(layoutText)
+    if key not in LAYOUT_CACHE:
+        LAYOUT_CACHE[key] = Layout(list(layoutText))
+    return LAYOUT_CACHE[key]
+
 def tryToLoad(fullname):
     if(not os.path.exists(fullname)): return None
     f = open(fullname)
-    try: return Layout([line.strip() for line in f])
+    try: return internLayout([line.strip() for line in f])
     finally: f.close()
@@ -14,46 +14,1634 @@
 
 from game import *
 import random, util, math
-import sys
+import sys, time
+import multiprocessing
 from learningAgents import ReinforcementAgent
 from featureExtractors import *
+from evaluators import *
 
 
 class MultimaxAgent(Agent):
-    def __init__(self, index=0, depth=5):
-        self.depth = depth
+    """
+    Searches depth plies ahead, one ply per agent move, and scores the
+    leaves with an Evaluator (see evaluators.py).  -a
+    evaluator=MazeDistanceEvaluator adds maze distance terms that let a
+    shallow search see food and ghosts (see benchmarks.py evaluators).  The
+    default stays ScoreEvaluator, the game scores: the default has to work
+    in every mode, and the shallow mode (like ExpectimaxAgent's default
+    star1 pruning) relies on how scores change; one default for all modes
+    also keeps every mode valuing the same leaves, so that shallow and maxn
+    decide alike, and the default game the one the agents always played.
+    The searchMode agent argument (-a searchMode=...) selects the search:
+
+      multimax  the original search: every agent picks greedily on the
+                next ply's scores
+      maxn      max^n: every agent maximizes its own component of the
+                backed-up score vector
+      shallow   max^n with shallow pruning, same decisions as maxn (only
+                with the score evaluator, whose bounds it relies on)
+      paranoid  alpha-beta on the searcher's score, assuming all the other
+                agents jointly minimize it
+      macro     paranoid, with the searcher moving from junction to junction
+                of the layout's JunctionGraph: depth counts corridors rather
+                than moves, so depth 2 or 3 already looks a dozen cells or
+                more ahead (see macroRoot and macroRadius)
+      factored  paranoid, with all the ghosts' moves as one ply in which
+                every ghost best-responds on its own (see ghostReplies), so
+                that the search grows linearly with the number of ghosts
+                rather than exponentially (for Pacman and the opponent)
+      batched   paranoid values without pruning: the whole tree is walked
+                first, and its leaves valued in one vectorized call of the
+                evaluator (see batchedRoot), for evaluators costly enough
+                that this beats pruning
+
+    getNodeNum counts the nodes expanded, whatever the mode.  benchmarks.py
+    searchModes checks that the modes decide as stated above.
+
+    The maxn, shallow and paranoid modes can cache results in a
+    util.TranspositionTable keyed on the position hash and the agent to
+    move, with values relative to the scores at the node.  Agent arguments:
+
+      ttSize     entries in the table, which caps its memory (0, the
+                 default, searches without one)
+      ttPolicy   replacement policy, 'depth' or 'always'
+      ttPersist  how long entries live: 'move' (one getAction), 'game' or
+                 'batch' (every game of a runGames batch on the layout)
+
+    With -a anytime=True those modes deepen one ply at a time instead,
+    until a per-move deadline, and play the best action of the last
+    completed iteration.  The deadline spreads the game's remaining time
+    (see setTimeBudget) over the moves expected to be left, and is at most
+    moveTime seconds.  Each iteration searches the root actions best first
+    by the previous iteration's values, and with a table the inner nodes
+    try the best action stored for them first.  depthLog records the depth
+    completed for every move.
+
+    -a ordering=True orders the children of every node for the pruning
+    modes: the best action stored in the table first, then the killer
+    actions of the ply (the last ones that were best or caused a cutoff at
+    that distance from the root), then by the history table, which credits
+    an (agent, cell, action) whenever it is best at a node.  firstBest
+    counts the nodes whose first child was the best one, out of
+    orderedNodes.
+
+    -a workers=N (N > 1) splits the root search of those modes over a pool
+    of N worker processes, one task per root action, or with splitDepth=2
+    per pair of root action and reply.  The states are pickled compactly
+    (a Layout pickles as its maze text), and every worker builds its own
+    layout tables once.  Each task searches with an empty table and
+    history, and the random draws of the rules seeded by its state and
+    path, and the results are merged in action order, so the decision is
+    the same whatever the scheduling and the number of workers.  It is
+    the serial search's decision too, except where a random draw of the
+    rules differs, or with ordering=True, where maxn can keep a different
+    one of several equally good replies.  The pool lives until the end of
+    the game (see final).
+
+    -a ponder=True searches during the other agents' turns: after choosing
+    its action, the agent forks a background process that searches the
+    ponderWidth likeliest states of its next turn (see predictReplies), one
+    after another.  When the game reaches one of them, the agent takes the
+    pondered result, waiting for it if it is being searched, and otherwise
+    stops the process and searches as usual.  Every search then starts
+    afresh (an empty table and history, and the rules' random draws seeded
+    by the state), so a pondered result is exactly what the agent would
+    have found itself and the game plays the same whatever the timing.
+    ponderTime adds up the seconds the background process ran, and
+    ponderHits and ponderMisses count the moves that did and did not
+    reuse a pondered search.
+    """
+    SEARCH_MODES = ('multimax', 'maxn', 'shallow', 'paranoid', 'macro', 'factored', 'batched')
+
+    # How far one move can lower a score under the rules in pacman.py:
+    # moving costs Pacman and the opponent 1 point, and eating costs the
+    # other agents at most 10 (Pacman eats) or 20 (the opponent eats).  A
+    # collision costs Pacman or the opponent 200 more but ends the game, so
+    # it happens at most once on any path.  No move raises the sum of the
+    # scores.  Shallow pruning uses these to bound the score vectors below a
+    # node.
+    MOVE_COST = 1
+    EAT_COST = {0: 10, 1: 20}
+    COLLISION_COST = 200
+
+    TABLE_PERSISTENCE = ('move', 'game', 'batch')
+
+    # Anytime search: the deepest iteration tried, the fewest moves assumed
+    # left in the game when spreading its time, and the share of that time
+    # used, which leaves some for the moves around the search
+    MAX_DEPTH = 64
+    MIN_MOVES_LEFT = 20
+    TIME_SAFETY = 0.8
+
+    # Move ordering: killer actions kept per ply
+    NUM_KILLERS = 2
+
+    def __init__(self, index=0, depth=5, searchMode='multimax', ttSize=0, ttPolicy='depth', ttPersist='batch',
+                 anytime=False, moveTime=1.0, ordering=False, workers=0, splitDepth=1, evaluator='ScoreEvaluator',
+                 macroRadius=2, ponder=False, ponderWidth=8):
+        if searchMode not in MultimaxAgent.SEARCH_MODES:
+            raise Exception('Unknown searchMode %s, use one of %s' % (searchMode, ', '.join(MultimaxAgent.SEARCH_MODES)))
+        self.evaluator = util.lookup(evaluator, globals())()
+        if searchMode == 'shallow' and not self.evaluator.scoresOnly:
+            raise Exception('shallow pruning needs the ScoreEvaluator')
+        if ttPersist not in MultimaxAgent.TABLE_PERSISTENCE:
+            raise Exception('Unknown ttPersist %s, use one of %s' % (ttPersist, ', '.join(MultimaxAgent.TABLE_PERSISTENCE)))
+        self.depth = int(depth)
         self.index = index
+        self.searchMode = searchMode
         self.nodeNum = 0
+        self.plyNodes = [0] * (max(self.depth, MultimaxAgent.MAX_DEPTH) + 1)
+        self.cutoffs = 0
+        self.moveCounts = (0, 0, 0)
+        self.moveSearched = False
+        self.maxCosts = {}
+        self.transpositionTable = None
+        if int(ttSize) > 0 and searchMode not in ('multimax', 'macro', 'factored', 'batched'):
+            self.transpositionTable = util.TranspositionTable(int(ttSize), ttPolicy)
+        self.tablePersistence = ttPersist
+        self.tableLayout = None
+        self.anytime = str(anytime).lower() in ('true', '1')
+        if self.anytime and searchMode == 'multimax':
+            raise Exception('anytime search needs searchMode maxn, shallow or paranoid')
+        self.moveTime = float(moveTime)
+        self.timeBudget = None
+        self.deadline = None
+        self.horizonReached = False
+        self.depthLog = []
+        self.ordering = str(ordering).lower() in ('true', '1')
+        self.killers = []
+        self.history = {}
+        self.historyLayout = None
+        self.searchDepth = 0
+        self.firstBest = 0
+        self.orderedNodes = 0
+        self.workers = int(workers)
+        self.splitDepth = int(splitDepth)
+        if searchMode == 'factored' and index >= 2:
+            raise Exception('factored search is for Pacman and the opponent')
+        if self.workers > 1 and searchMode in ('multimax', 'macro', 'factored', 'batched'):
+            raise Exception('parallel search needs searchMode maxn, shallow or paranoid')
+        self.macroRadius = int(macroRadius)
+        self.pool = None
+        self.agents = []
+        self.ponder = str(ponder).lower() in ('true', '1')
+        if self.ponder and (self.anytime or self.workers > 1):
+            raise Exception('pondering needs a fixed depth search in one process')
+        self.ponderWidth = int(ponderWidth)
+        self.ponderProcess = None
+        self.ponderConnection = None
+        self.ponderStart = None
+        self.ponderKeys = set()
+        self.ponderRunning = None
+        self.ponderResults = {}
+        self.ponderTime = 0.0
+        self.ponderHits = 0
+        self.ponderMisses = 0
+        # What a worker needs to build the same searcher
+        self.workerOptions = dict(index=index, depth=depth, searchMode=searchMode, ttSize=ttSize,
+                                  ttPolicy=ttPolicy, ttPersist='move', ordering=ordering, evaluator=evaluator)
 
     def getNodeNum(self):
         return self.nodeNum
 
+    def getTableHits(self):
+        "Transposition table hits so far"
+        if self.transpositionTable is None: return 0
+        return self.transpositionTable.hits
+
+    def startMoveStats(self):
+        "Starts the counts that getMoveStats reports for this move"
+        self.plyNodes = [0] * len(self.plyNodes)
+        self.moveCounts = (self.nodeNum, self.cutoffs, self.getTableHits())
+        self.moveSearched = True
+
+    def getMoveStats(self):
+        """
+        Telemetry of the last getAction (see Agent): the nodes searched, in
+        all and at every distance from the root (for anytime search, in the
+        last completed iteration), the effective branching factor (the
+        depth-th root of the nodes at the deepest ply), the
+        alpha-beta and shallow cutoffs, the table hits and the depth
+        reached.  A move taken from pondering searched no nodes of its own.
+        None if no search ran since the last call, as for the moves that a
+        subclass chooses without searching (the Q agents' greedy moves).
+        """
+        if not self.moveSearched: return None
+        self.moveSearched = False
+        nodes, cutoffs, hits = self.moveCounts
+        nodesByDepth = list(self.plyNodes)
+        while nodesByDepth and nodesByDepth[-1] == 0: nodesByDepth.pop()
+        branching = 0.0
+        if len(nodesByDepth) > 1:
+            branching = nodesByDepth[-1] ** (1.0 / (len(nodesByDepth) - 1))
+        depth = self.depth
+        if self.anytime and self.depthLog: depth = self.depthLog[-1]
+        return {'nodes': self.nodeNum - nodes, 'nodesByDepth': nodesByDepth, 'branching': branching,
+                'cutoffs': self.cutoffs - cutoffs, 'ttHits': self.getTableHits() - hits, 'depth': depth}
+
+    def registerInitialState(self, gameState):
+        self.stopPondering()
+        if self.transpositionTable is not None and self.tablePersistence == 'game':
+            self.transpositionTable.clear()
+
+    def registerAgents(self, agents):
+        self.agents = agents
+
+    def final(self, gameState):
+        self.stopPondering()
+        self.stopPool()
+
+    def setTimeBudget(self, moveTime, totalTime):
+        self.timeBudget = (moveTime, totalTime)
+
     def getAction(self, gameState):
         # print self.index
-        scores, bestMultiAction = self.multimax(gameState, self.index, self.depth)
-        return bestMultiAction
+        # The search walks the tree by making and unmaking moves on one copy
+        state = gameState.deepCopy()
+        self.startMoveStats()
+        if self.ponder:
+            return self.ponderAction(state)
+        table = self.transpositionTable
+        if table is not None:
+            # Positions on different layouts can hash alike
+            if self.tablePersistence == 'move' or state.data.layout is not self.tableLayout:
+                table.clear()
+                self.tableLayout = state.data.layout
+            table.newSearch()
+        if self.ordering:
+            self.startOrdering(state)
+        if self.searchMode == 'multimax':
+            self.searchDepth = self.depth
+            scores, bestMultiAction = self.multimax(state, self.index, self.depth)
+            return bestMultiAction
+        legal = self.getSearchActions(state, self.index)
+        if self.anytime:
+            return self.iterativeDeepening(state, legal)
+        if self.ordering:
+            entry = None
+            if table is not None:
+                entry = self.probeEntry(state, (state.getPositionHash(), self.index))
+            self.searchDepth = self.depth
+            legal = self.orderActions(state, self.index, legal, entry, self.depth)
+        bestActions, values = self.searchRoot(state, self.depth, legal)
+        return random.choice(bestActions)
 
-    def multimax(self, currentGameState, agentIndex, dep):
+    def ponderAction(self, state):
+        """
+        getAction with pondering: takes the pondered best actions for state
+        if there are any, else searches, then starts pondering the next turn.
+        """
+        bestActions = self.takePondered(hash(state))
+        if bestActions is None:
+            bestActions = self.searchBestActions(state)
+        action = random.choice(bestActions)
+        self.startPondering(self.predictReplies(state, action))
+        return action
+
+    def searchBestActions(self, state):
+        """
+        The best actions from state, in getSearchActions order, by a search
+        that depends on the state alone: the table and history start empty,
+        and the random numbers the rules draw during the search are seeded
+        by the state's hash.
+        """
+        saved = random.getstate()
+        random.seed(hash(state))
+        try:
+            if self.transpositionTable is not None:
+                self.transpositionTable.clear()
+                self.transpositionTable.newSearch()
+            self.history = {}
+            if self.ordering:
+                self.startOrdering(state)
+            if self.searchMode == 'multimax':
+                return [self.multimax(state, self.index, self.depth)[1]]
+            legal = self.getSearchActions(state, self.index)
+            searched = legal
+            if self.ordering:
+                self.searchDepth = self.depth
+                searched = self.orderActions(state, self.index, legal, None, self.depth)
+            bestActions, values = self.searchRoot(state, self.depth, searched)
+            return [action for action in legal if action in bestActions]
+        finally:
+            random.setstate(saved)
+
+    def predictReplies(self, state, action):
+        """
+        Returns (hash, state) for the likeliest states of the searcher's next
+        turn, after action and one move of every other agent, most likely
+        first and at most ponderWidth of them.  Agents that declare
+        themselves stochastic (see registerAgents) move by their
+        getDistribution, the others uniformly over their search actions.
+        """
+        numAgents = state.getNumAgents()
+        candidates = [(1.0, state.generateSuccessor(self.index, action))]
+        agentIndex = (self.index + 1) % numAgents
+        while agentIndex != self.index:
+            model = None
+            if agentIndex < len(self.agents) and self.agents[agentIndex] and self.agents[agentIndex].stochastic:
+                model = self.agents[agentIndex]
+            successors = []
+            for p, candidate in candidates:
+                # A finished game has no next turn to ponder
+                if candidate.isGhostWin() or candidate.isGhostLose(): continue
+                if model is not None:
+                    dist = model.getDistribution(candidate)
+                    replies = [(reply, dist[reply]) for reply in candidate.getLegalActions(agentIndex) if dist[reply] > 0]
+                else:
+                    legal = self.getSearchActions(candidate, agentIndex)
+                    replies = [(reply, 1.0 / len(legal)) for reply in legal]
+                for reply, q in replies:
+                    successors.append((p * q, candidate.generateSuccessor(agentIndex, reply)))
+            successors.sort(key=lambda successor: -successor[0])
+            candidates = successors[:self.ponderWidth]
+            agentIndex = (agentIndex + 1) % numAgents
+        return [(hash(candidate), candidate) for p, candidate in candidates
+                if not candidate.isGhostWin() and not candidate.isGhostLose()]
+
+    def startPondering(self, candidates):
+        self.stopPondering()
+        if not candidates: return
+        self.ponderConnection, child = multiprocessing.Pipe()
+        # Forked, so the process starts from this agent and the candidate
+        # states as they are, without pickling them
+        self.ponderProcess = multiprocessing.Process(target=_ponder, args=(self, child, candidates))
+        self.ponderProcess.daemon = True
+        self.ponderStart = time.time()
+        self.ponderProcess.start()
+        child.close()
+        self.ponderKeys = set([key for key, candidate in candidates])
+
+    def takePondered(self, key):
+        """
+        Returns the pondered best actions for the state with hash key, or
+        None if it was not pondered, and stops pondering.
+        """
+        if self.ponderProcess is None: return None
+        bestActions = None
+        try:
+            while self.ponderConnection.poll():
+                self.readPondered()
+            if key in self.ponderKeys:
+                while key not in self.ponderResults and self.ponderRunning == key:
+                    self.readPondered()
+                bestActions = self.ponderResults.get(key)
+        except EOFError:
+            pass
+        self.stopPondering()
+        if bestActions is None: self.ponderMisses += 1
+        else: self.ponderHits += 1
+        return bestActions
+
+    def readPondered(self):
+        message = self.ponderConnection.recv()
+        if message[0] == 'start':
+            self.ponderRunning = message[1]
+        else:
+            self.ponderResults[message[1]] = message[2]
+
+    def stopPondering(self):
+        if self.ponderProcess is None: return
+        self.ponderProcess.terminate()
+        self.ponderProcess.join()
+        self.ponderConnection.close()
+        self.ponderTime += time.time() - self.ponderStart
+        self.ponderProcess = None
+        self.ponderConnection = None
+        self.ponderKeys = set()
+        self.ponderRunning = None
+        self.ponderResults = {}
+
+    def getMoveTime(self, state):
+        """
+        Seconds for this move's anytime search: an even share of the game's
+        remaining time over the moves expected to be left, which the food
+        left bounds, and no more than moveTime.
+        """
+        seconds = self.moveTime
+        if self.timeBudget is not None:
+            moveTime, totalTime = self.timeBudget
+            movesLeft = max(MultimaxAgent.MIN_MOVES_LEFT, state.getNumFood())
+            seconds = min(seconds, moveTime, totalTime / movesLeft)
+        return max(0, seconds * MultimaxAgent.TIME_SAFETY)
+
+    def iterativeDeepening(self, state, legal):
+        """
+        Searches one ply deeper at a time until the deadline, and returns a
+        best action of the deepest completed iteration.  It stops early once
+        an iteration saw the end of every line of play.
+        """
+        self.deadline = time.time() + self.getMoveTime(state)
+        bestActions = legal
+        depthReached = 0
+        # getMoveStats reports the nodes by ply of the last completed iteration
+        plyNodes = [0] * len(self.plyNodes)
+        try:
+            for depth in range(1, MultimaxAgent.MAX_DEPTH + 1):
+                self.horizonReached = False
+                self.plyNodes = [0] * len(plyNodes)
+                bestActions, values = self.searchRoot(state, depth, legal)
+                depthReached = depth
+                plyNodes = self.plyNodes
+                legal = sorted(legal, key=lambda action: -values[action])
+                if not self.horizonReached: break
+        except SearchTimeout:
+            pass
+        self.deadline = None
+        self.plyNodes = plyNodes
+        self.depthLog.append(depthReached)
+        return random.choice(bestActions)
+
+    def searchRoot(self, state, depth, legal):
+        """
+        Searches the actions in legal from state, in that order, depth plies
+        deep.  Returns the best actions and a dict from every action to its
+        value for the searcher (only an upper bound for actions that the
+        pruning modes proved worse than the best).
+        """
+        self.searchDepth = depth
+        if self.workers > 1:
+            return self.parallelRoot(state, depth, legal)
+        if self.searchMode == 'macro':
+            return self.macroRoot(state, depth, legal)
+        if self.searchMode == 'factored':
+            return self.factoredRoot(state, depth, legal)
+        if self.searchMode == 'batched':
+            return self.batchedRoot(state, depth, legal)
+        if self.searchMode == 'paranoid':
+            return self.paranoidRoot(state, depth, legal)
+        return self.maxnRoot(state, depth, legal)
+
+    def getPool(self):
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers, _initSearchWorker, (self.workerOptions,))
+        return self.pool
+
+    def stopPool(self):
+        "Ends the worker processes, which getPool starts again when needed"
+        if self.pool is None: return
+        self.pool.terminate()
+        self.pool.join()
+        self.pool = None
+
+    def parallelRoot(self, state, depth, legal):
+        """
+        searchRoot on the worker pool.  Every subtree is searched with a full
+        window, so the values are exact and the best actions are
+        searchRoot's, with the exceptions given in the class docstring.
+        """
         self.nodeNum += 1
-        legal = currentGameState.getLegalActions(agentIndex)
+        self.plyNodes[0] += 1
+        nextAgent = (self.index + 1) % state.getNumAgents()
+        tasks = []
+        numPaths = []
+        for action in legal:
+            replies = []
+            if self.splitDepth > 1 and depth > 1:
+                undo = state.makeMove(self.index, action, validate=False)
+                replies = self.getSearchActions(state, nextAgent)
+                state.unmakeMove(undo)
+                if replies:
+                    self.nodeNum += 1
+                    self.plyNodes[1] += 1
+            paths = [(action, reply) for reply in replies] or [(action,)]
+            numPaths.append(len(paths))
+            tasks.extend([(state, path, depth, self.deadline) for path in paths])
+
+        results = self.getPool().map(_searchSubtree, tasks)
+        if None in results: raise SearchTimeout()
+        for value, nodes, horizonReached, plyNodes, cutoffs in results:
+            self.nodeNum += nodes
+            self.cutoffs += cutoffs
+            for ply, count in enumerate(plyNodes):
+                self.plyNodes[ply] += count
+            if horizonReached: self.horizonReached = True
+
+        best = None
+        bestActions = []
+        values = {}
+        for action, count in zip(legal, numPaths):
+            replyValues = [result[0] for result in results[:count]]
+            results = results[count:]
+            value = replyValues[0]
+            if self.searchMode == 'paranoid':
+                if nextAgent == self.index: value = max(replyValues)
+                else: value = min(replyValues)
+            else:
+                # The replying agent keeps its first best reply, like maxn
+                for replyValue in replyValues:
+                    if replyValue[nextAgent] > value[nextAgent]: value = replyValue
+                value = value[self.index]
+            values[action] = value
+            if best == None or value > best:
+                best = value
+                bestActions = [action]
+            elif value == best:
+                bestActions.append(action)
+        return bestActions, values
+
+    def searchSubtree(self, state, path, depth):
+        """
+        Makes the moves in path, the searcher's first, and returns the value
+        of the resulting state searched to the rest of depth, the nodes it
+        took, whether it reached the depth, and the nodes by ply and cutoffs
+        for getMoveStats.  The pool workers run this for parallelRoot.
+        """
+        self.startMoveStats()
+        nodeNum, cutoffs = self.moveCounts[:2]
+        self.horizonReached = False
+        if self.transpositionTable is not None:
+            self.transpositionTable.clear()
+        self.history = {}
+        if self.ordering:
+            self.startOrdering(state)
+        self.searchDepth = depth
+        # Tasks pickled together share one copy of the state
+        state = state.deepCopy()
+        agentIndex = self.index
+        for action in path:
+            state.makeMove(agentIndex, action, validate=False)
+            agentIndex = (agentIndex + 1) % state.getNumAgents()
+        dep = depth - len(path)
+        if self.searchMode == 'paranoid':
+            value = self.paranoid(state, agentIndex, dep, -float('inf'), float('inf'))
+        else:
+            value = self.maxn(state, agentIndex, dep)
+        return value, self.nodeNum - nodeNum, self.horizonReached, self.plyNodes, self.cutoffs - cutoffs
+
+    def checkDeadline(self):
+        # Called every 256 nodes, to keep the clock reads cheap
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchTimeout()
+
+    def startOrdering(self, state):
+        """
+        Resets the killers for a new search, and ages the history so that
+        recent searches weigh more.  Cells differ between layouts, so a new
+        layout starts a new history.
+        """
+        self.killers = [[] for ply in range(max(MultimaxAgent.MAX_DEPTH, self.depth) + 1)]
+        if state.data.layout is not self.historyLayout:
+            self.history = {}
+            self.historyLayout = state.data.layout
+        for key in self.history:
+            self.history[key] /= 2
+
+    def orderActions(self, state, agentIndex, legal, entry, dep):
+        """
+        Returns legal in the order to search it: the best action stored for
+        the node in the transposition table entry, if any, first, then with
+        ordering, the ply's killers and the rest by history.
+        """
+        if len(legal) < 2: return legal
+        ttAction = None
+        if entry is not None: ttAction = entry[2]
+        if not self.ordering:
+            if ttAction in legal and ttAction != legal[0]:
+                legal = [ttAction] + [action for action in legal if action != ttAction]
+            return legal
+        killers = self.killers[self.searchDepth - dep]
+        cell = state.getMoveTable().getCell(state.data.agentStates[agentIndex].configuration)
+        history = self.history
+        def rank(action):
+            if action == ttAction: return (2, 0)
+            if action in killers: return (1, -killers.index(action))
+            return (0, history.get((agentIndex, cell, action), 0))
+        return sorted(legal, key=rank, reverse=True)
+
+    def creditAction(self, state, agentIndex, legal, action, dep):
+        """
+        Records that action was best at the node, or caused a cutoff there:
+        it becomes a killer for the ply and gains history, more so the
+        deeper the subtree it won.
+        """
+        if len(legal) < 2: return
+        self.orderedNodes += 1
+        if action == legal[0]: self.firstBest += 1
+        if not self.ordering: return
+        killers = self.killers[self.searchDepth - dep]
+        if action in killers: killers.remove(action)
+        killers.insert(0, action)
+        del killers[MultimaxAgent.NUM_KILLERS:]
+        cell = state.getMoveTable().getCell(state.data.agentStates[agentIndex].configuration)
+        key = (agentIndex, cell, action)
+        self.history[key] = self.history.get(key, 0) + dep * dep
+
+    def getSearchActions(self, state, agentIndex):
+        legal = state.getLegalActions(agentIndex)
         if Directions.STOP in legal: legal.remove(Directions.STOP)
+        return legal
+
+    def multimax(self, currentGameState, agentIndex, dep):
+        self.nodeNum += 1
+        self.plyNodes[self.searchDepth - dep] += 1
+        legal = self.getSearchActions(currentGameState, agentIndex)
 
         if dep == 0 or not legal:
-          return (currentGameState.getScores(), None)
+          return (self.evaluator.evaluate(currentGameState), None)
 
         scoreActions = []
 
         for action in legal:
-          childState = currentGameState.generateSuccessor(agentIndex, action)
-          childScores, childAction = self.multimax(childState, (agentIndex + 1) % currentGameState.getNumAgents(), dep - 1)
+          undo = currentGameState.makeMove(agentIndex, action, validate=False)
+          childScores, childAction = self.multimax(currentGameState, (agentIndex + 1) % currentGameState.getNumAgents(), dep - 1)
+          currentGameState.unmakeMove(undo)
           scoreActions.append((childScores[agentIndex], action))
         
         bestScore = max(scoreActions)[0]
         bestActions = [pair[1] for pair in scoreActions if pair[0] == bestScore]
 
-        return (currentGameState.getScores(), random.choice(bestActions))
+        return (self.evaluator.evaluate(currentGameState), random.choice(bestActions))
+
+    def maxnRoot(self, state, depth, legal):
+        """
+        Finds the actions whose max^n value is best for the searcher.  Ties
+        are only broken here: inside the tree every agent keeps the first
+        best child, which is what lets shallow pruning skip children that can
+        at best tie.
+        """
+        self.nodeNum += 1
+        self.plyNodes[0] += 1
+        nextAgent = (self.index + 1) % state.getNumAgents()
+        best = None
+        bestActions = []
+        values = {}
+        if self.searchMode == 'shallow':
+            boundBase = self.childBoundBase(state, self.index, depth)
+        for action in legal:
+            bound = None
+            if self.searchMode == 'shallow' and best != None:
+                # Only prune children that are strictly worse for the searcher
+                bound = boundBase - best + 1e-9
+            undo = state.makeMove(self.index, action, validate=False)
+            scores = self.maxn(state, nextAgent, depth - 1, bound)
+            state.unmakeMove(undo)
+            values[action] = scores[self.index]
+            if best == None or scores[self.index] > best:
+                best = scores[self.index]
+                bestScores = scores
+                bestActions = [action]
+            elif scores[self.index] == best:
+                bestActions.append(action)
+        if self.transpositionTable is not None:
+            self.storeEntry(state, (state.getPositionHash(), self.index), depth, bestScores, bestActions[0], util.TranspositionTable.EXACT)
+        return bestActions, values
+
+    def maxn(self, state, agentIndex, dep, bound=None):
+        """
+        Returns the max^n score vector of state, agentIndex to move.  With a
+        bound (shallow mode), the search stops as soon as agentIndex is sure
+        to get at least bound, since the parent then prefers another child.
+        """
+        self.nodeNum += 1
+        self.plyNodes[self.searchDepth - dep] += 1
+        if self.nodeNum & 255 == 0: self.checkDeadline()
+        legal = self.getSearchActions(state, agentIndex)
+        if dep == 0 or not legal:
+            if legal: self.horizonReached = True
+            return self.evaluator.evaluate(state)
+
+        table = self.transpositionTable
+        entry = None
+        if table is not None:
+            key = (state.getPositionHash(), agentIndex)
+            entry = self.probeEntry(state, key)
+            if entry is not None and entry[0] >= dep:
+                depth, scores, action, flag = entry
+                if flag == util.TranspositionTable.EXACT or (bound != None and scores[agentIndex] >= bound):
+                    self.horizonReached = True # Unknown, so assume there is more to search
+                    return scores
+        if entry is not None or self.ordering:
+            legal = self.orderActions(state, agentIndex, legal, entry, dep)
+
+        shallow = self.searchMode == 'shallow'
+        if shallow:
+            boundBase = self.childBoundBase(state, agentIndex, dep)
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+        best = None
+        flag = util.TranspositionTable.EXACT
+        for action in legal:
+            childBound = None
+            if shallow and best != None:
+                childBound = boundBase - best[agentIndex]
+            undo = state.makeMove(agentIndex, action, validate=False)
+            scores = self.maxn(state, nextAgent, dep - 1, childBound)
+            state.unmakeMove(undo)
+            if best == None or scores[agentIndex] > best[agentIndex]:
+                best = scores
+                bestAction = action
+            if bound != None and best[agentIndex] >= bound:
+                # Only a lower bound on what agentIndex gets here
+                flag = util.TranspositionTable.LOWER
+                self.cutoffs += 1
+                break
+        self.creditAction(state, agentIndex, legal, bestAction, dep)
+        if table is not None:
+            self.storeEntry(state, key, dep, best, bestAction, flag)
+        return best
+
+    def childBoundBase(self, state, agentIndex, dep):
+        """
+        Once agentIndex holds a child worth best, a child in which the next
+        agent gets at least childBoundBase - best cannot be better for
+        agentIndex: the scores below state sum to at most their current sum,
+        and the third agents keep at least their lower bounds.
+        """
+        numAgents = state.getNumAgents()
+        nextAgent = (agentIndex + 1) % numAgents
+        base = sum(state.data.scores)
+        for other in range(numAgents):
+            if other != agentIndex and other != nextAgent:
+                base -= self.scoreLowerBound(state, other, agentIndex, dep)
+        return base
+
+    def scoreLowerBound(self, state, agent, agentIndex, dep):
+        """
+        The lowest score agent can have after the next dep moves from state,
+        agentIndex moving first.
+        """
+        key = (agent, agentIndex, dep, state.getNumAgents())
+        if key not in self.maxCosts:
+            cost = 0
+            if agent in MultimaxAgent.EAT_COST:
+                cost += MultimaxAgent.COLLISION_COST
+            for ply in range(dep):
+                mover = (agentIndex + ply) % state.getNumAgents()
+                if mover == agent:
+                    cost += MultimaxAgent.MOVE_COST
+                elif mover in MultimaxAgent.EAT_COST:
+                    cost += MultimaxAgent.EAT_COST[mover]
+            self.maxCosts[key] = cost
+        return state.data.scores[agent] - self.maxCosts[key]
+
+    def probeEntry(self, state, key):
+        """
+        Returns (depth, value, action, flag) from the transposition table for
+        state, or None.  The key is the position hash and the agent to move.
+        The value is a score vector in the max^n modes and the searcher's
+        score in paranoid mode.
+        """
+        entry = self.transpositionTable.lookup(key)
+        if entry is None: return None
+        depth, relative, action, flag = entry
+        scores = state.data.scores
+        if self.searchMode == 'paranoid':
+            return (depth, scores[self.index] + relative, action, flag)
+        return (depth, [score + change for score, change in zip(scores, relative)], action, flag)
+
+    def storeEntry(self, state, key, dep, value, action, flag):
+        scores = state.data.scores
+        if self.searchMode == 'paranoid':
+            relative = value - scores[self.index]
+        else:
+            relative = tuple([v - score for v, score in zip(value, scores)])
+        self.transpositionTable.store(key, dep, relative, action, flag)
+
+    def paranoidRoot(self, state, depth, legal):
+        """
+        Finds the actions with the best paranoid value.  The children after
+        the first are searched with alpha just below the best value so far,
+        so that ties get exact values.
+        """
+        self.nodeNum += 1
+        self.plyNodes[0] += 1
+        nextAgent = (self.index + 1) % state.getNumAgents()
+        best = -float('inf')
+        bestActions = []
+        values = {}
+        for action in legal:
+            undo = state.makeMove(self.index, action, validate=False)
+            value = self.paranoid(state, nextAgent, depth - 1, best - 1e-9, float('inf'))
+            state.unmakeMove(undo)
+            values[action] = value
+            if value > best:
+                best = value
+                bestActions = [action]
+            elif value == best:
+                bestActions.append(action)
+        if self.transpositionTable is not None:
+            self.storeEntry(state, (state.getPositionHash(), self.index), depth, best, bestActions[0], util.TranspositionTable.EXACT)
+        return bestActions, values
+
+    def paranoid(self, state, agentIndex, dep, alpha, beta):
+        """
+        Fail-soft alpha-beta on the searcher's score: the searcher maximizes
+        it and every other agent minimizes it.
+        """
+        self.nodeNum += 1
+        self.plyNodes[self.searchDepth - dep] += 1
+        if self.nodeNum & 255 == 0: self.checkDeadline()
+        legal = self.getSearchActions(state, agentIndex)
+        if dep == 0 or not legal:
+            if legal: self.horizonReached = True
+            return self.evaluator.evaluate(state)[self.index]
+
+        table = self.transpositionTable
+        entry = None
+        if table is not None:
+            key = (state.getPositionHash(), agentIndex)
+            entry = self.probeEntry(state, key)
+            if entry is not None and entry[0] >= dep:
+                depth, value, action, flag = entry
+                if flag == util.TranspositionTable.EXACT or \
+                   (flag == util.TranspositionTable.LOWER and value >= beta) or \
+                   (flag == util.TranspositionTable.UPPER and value <= alpha):
+                    self.horizonReached = True # Unknown, so assume there is more to search
+                    return value
+        if entry is not None or self.ordering:
+            legal = self.orderActions(state, agentIndex, legal, entry, dep)
+        alphaOrig, betaOrig = alpha, beta
+
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+        maximizing = agentIndex == self.index
+        if maximizing: value = -float('inf')
+        else: value = float('inf')
+        for action in legal:
+            undo = state.makeMove(agentIndex, action, validate=False)
+            childValue = self.paranoid(state, nextAgent, dep - 1, alpha, beta)
+            state.unmakeMove(undo)
+            if maximizing and childValue > value or not maximizing and childValue < value:
+                value = childValue
+                bestAction = action
+            if maximizing:
+                if value >= beta:
+                    self.cutoffs += 1
+                    break
+                alpha = max(alpha, value)
+            else:
+                if value <= alpha:
+                    self.cutoffs += 1
+                    break
+                beta = min(beta, value)
+        self.creditAction(state, agentIndex, legal, bestAction, dep)
+
+        if table is not None:
+            if value <= alphaOrig: flag = util.TranspositionTable.UPPER
+            elif value >= betaOrig: flag = util.TranspositionTable.LOWER
+            else: flag = util.TranspositionTable.EXACT
+            self.storeEntry(state, key, dep, value, bestAction, flag)
+        return value
+
+    def batchedRoot(self, state, depth, legal):
+        """
+        Finds the actions with the best paranoid value in two passes: the
+        tree below every action is walked in full, adding its leaves to a
+        LeafBatch (see collectLeaves), then the evaluator values them all
+        at once and the values are backed up through the trees.  Without
+        pruning the search visits more leaves than paranoid mode, but pays
+        the Python overhead of evaluation once per search rather than once
+        per leaf.
+        """
+        self.nodeNum += 1
+        self.plyNodes[0] += 1
+        nextAgent = (self.index + 1) % state.getNumAgents()
+        batch = LeafBatch(state)
+        trees = []
+        for action in legal:
+            undo = state.makeMove(self.index, action, validate=False)
+            trees.append(self.collectLeaves(state, nextAgent, depth - 1, batch))
+            state.unmakeMove(undo)
+        leafValues = self.evaluator.evaluateBatch(batch)[:, self.index].tolist()
+
+        best = -float('inf')
+        bestActions = []
+        values = {}
+        for action, tree in zip(legal, trees):
+            value = self.backUp(tree, leafValues)
+            values[action] = value
+            if value > best:
+                best = value
+                bestActions = [action]
+            elif value == best:
+                bestActions.append(action)
+        return bestActions, values
+
+    def collectLeaves(self, state, agentIndex, dep, batch):
+        """
+        Adds the leaves below state to batch.  Returns the row of a leaf, or
+        for an inner node the pair of whether the searcher moves there and
+        the trees of its children.
+        """
+        self.nodeNum += 1
+        self.plyNodes[self.searchDepth - dep] += 1
+        if self.nodeNum & 255 == 0: self.checkDeadline()
+        legal = self.getSearchActions(state, agentIndex)
+        if dep == 0 or not legal:
+            if legal: self.horizonReached = True
+            return batch.add(state)
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+        children = []
+        for action in legal:
+            undo = state.makeMove(agentIndex, action, validate=False)
+            children.append(self.collectLeaves(state, nextAgent, dep - 1, batch))
+            state.unmakeMove(undo)
+        return agentIndex == self.index, children
+
+    def backUp(self, tree, leafValues):
+        "The paranoid value of a tree from collectLeaves"
+        if type(tree) is int: return leafValues[tree]
+        maximizing, children = tree
+        values = [self.backUp(child, leafValues) for child in children]
+        if maximizing: return max(values)
+        return min(values)
+
+    def factoredRoot(self, state, depth, legal):
+        """
+        Finds the actions with the best factored value, like paranoidRoot.
+        """
+        self.nodeNum += 1
+        self.plyNodes[0] += 1
+        best = -float('inf')
+        bestActions = []
+        values = {}
+        for action in legal:
+            undo = state.makeMove(self.index, action, validate=False)
+            value = self.factored(state, self.index + 1, depth - 1, best - 1e-9, float('inf'))
+            state.unmakeMove(undo)
+            values[action] = value
+            if value > best:
+                best = value
+                bestActions = [action]
+            elif value == best:
+                bestActions.append(action)
+        return bestActions, values
+
+    def factored(self, state, agentIndex, dep, alpha, beta):
+        """
+        Fail-soft alpha-beta on the searcher's score with the ghosts moving
+        together: at agentIndex 2 every ghost makes the move ghostReplies
+        picks, as one ply of the search.
+        """
+        self.nodeNum += 1
+        self.plyNodes[self.searchDepth - dep] += 1
+        if self.nodeNum & 255 == 0: self.checkDeadline()
+        numAgents = state.getNumAgents()
+        if agentIndex >= numAgents: agentIndex = 0
+        if agentIndex >= 2:
+            legal = not (state.isGhostWin() or state.isGhostLose())
+        else:
+            legal = self.getSearchActions(state, agentIndex)
+        if dep == 0 or not legal:
+            if legal: self.horizonReached = True
+            return self.evaluator.evaluate(state)[self.index]
+
+        if agentIndex >= 2:
+            undos = []
+            for ghost, action in self.ghostReplies(state, dep):
+                # A ghost that catches a Pacman ends the game, and the ply
+                if state.isGhostWin(): break
+                undos.append(state.makeMove(ghost, action, validate=False))
+            value = self.factored(state, 0, dep - 1, alpha, beta)
+            for undo in reversed(undos):
+                state.unmakeMove(undo)
+            return value
+
+        maximizing = agentIndex == self.index
+        if maximizing: value = -float('inf')
+        else: value = float('inf')
+        for action in legal:
+            undo = state.makeMove(agentIndex, action, validate=False)
+            childValue = self.factored(state, agentIndex + 1, dep - 1, alpha, beta)
+            state.unmakeMove(undo)
+            if maximizing:
+                value = max(value, childValue)
+                if value >= beta:
+                    self.cutoffs += 1
+                    break
+                alpha = max(alpha, value)
+            else:
+                value = min(value, childValue)
+                if value <= alpha:
+                    self.cutoffs += 1
+                    break
+                beta = min(beta, value)
+        return value
+
+    def ghostReplies(self, state, dep):
+        """
+        Returns (ghost, action) for every ghost, each chosen on its own
+        against the position before any ghost moves: the action after which
+        the leaf evaluator values the searcher lowest, and on ties the one
+        that brings the ghost nearest to the searcher by maze distance.
+        Costs one trial move per ghost action, so linear in the ghosts;
+        they count as nodes one ply below the ghosts' ply, dep deep.
+        """
+        distances = state.getMazeDistances()
+        toSearcher = distances.getMatrix()[distances.getCell(state.data.agentStates[self.index].getPosition())]
+        replies = []
+        for ghost in range(2, state.getNumAgents()):
+            legal = self.getSearchActions(state, ghost)
+            if len(legal) == 1:
+                replies.append((ghost, legal[0]))
+                continue
+            best = None
+            for action in legal:
+                self.nodeNum += 1
+                self.plyNodes[self.searchDepth - dep + 1] += 1
+                undo = state.makeMove(ghost, action, validate=False)
+                cell = distances.getCell(state.data.agentStates[ghost].getPosition())
+                key = (self.evaluator.evaluate(state)[self.index], toSearcher[cell])
+                state.unmakeMove(undo)
+                if best == None or key < best[0]:
+                    best = (key, action)
+            replies.append((ghost, best[1]))
+        return replies
+
+    def macroRoot(self, state, depth, legal):
+        """
+        Macro-action search: the searcher's moves are whole routes to the
+        next junction (see JunctionGraph.getRoutes), and depth counts them,
+        so the search looks as many corridors ahead.  Every agent still
+        moves one cell per ply, so collisions happen exactly when they
+        would in the game.  Within a corridor the other agents keep going
+        (the one move that neither stops nor reverses).  At the first
+        junction an agent reaches within macroRadius maze steps of the
+        searcher, during each of the searcher's routes, it chooses its
+        corridor to minimize the searcher's value as in paranoid mode,
+        nearest to the searcher first; at any other junction it takes the
+        step towards the searcher.  So every agent branches at most once
+        per route, and a macro ply costs about what a round of paranoid
+        plies does.  Returns the first actions of the best routes and their
+        values, with the routes searched in the order of legal.
+        """
+        self.nodeNum += 1
+        self.plyNodes[0] += 1
+        graph = state.getJunctionGraph()
+        cell = state.getMoveTable().getCell(state.data.agentStates[self.index].configuration)
+        routes = graph.getRoutes(cell)
+        routes.sort(key=lambda (actions, cells): legal.index(actions[0]))
+        best = -float('inf')
+        bestActions = []
+        values = {}
+        for actions, cells in routes:
+            value = self.macroMove(state, actions, depth - 1, 0, best - 1e-9, float('inf'))
+            values[actions[0]] = value
+            if value > best:
+                best = value
+                bestActions = [actions[0]]
+            elif value == best:
+                bestActions.append(actions[0])
+        return bestActions, values
+
+    def macroMove(self, state, route, dep, branched, alpha, beta):
+        """
+        The value of the searcher taking the first action of route, with
+        the rest of the route to follow.  branched has bit i set once agent
+        i chose a corridor during this route.
+        """
+        self.nodeNum += 1
+        self.plyNodes[self.searchDepth - dep] += 1
+        if self.nodeNum & 255 == 0: self.checkDeadline()
+        undo = state.makeMove(self.index, route[0], validate=False)
+        value = self.macro(state, (self.index + 1) % state.getNumAgents(), dep, route[1:], branched, alpha, beta)
+        state.unmakeMove(undo)
+        return value
+
+    def macro(self, state, agentIndex, dep, route, branched, alpha, beta):
+        """
+        Fail-soft alpha-beta value of state for macroRoot, agentIndex to move
+        and the searcher following route, with dep more routes to choose
+        once it ends.
+        """
+        if state.isGhostWin() or state.isGhostLose():
+            return self.evaluator.evaluate(state)[self.index]
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+        if agentIndex == self.index:
+            if route: return self.macroMove(state, route, dep, branched, alpha, beta)
+            if dep == 0:
+                self.horizonReached = True
+                return self.evaluator.evaluate(state)[self.index]
+            # A junction: choose the next route, the one with most food first
+            cell = state.getMoveTable().getCell(state.data.agentStates[self.index].configuration)
+            food = state.data.food.bits
+            routes = state.getJunctionGraph().getRoutes(cell)
+            routes.sort(key=lambda (actions, cells): -len([c for c in cells if food >> c & 1]))
+            value = -float('inf')
+            for actions, cells in routes:
+                value = max(value, self.macroMove(state, actions, dep - 1, 0, alpha, beta))
+                if value >= beta:
+                    self.cutoffs += 1
+                    break
+                alpha = max(alpha, value)
+            return value
+
+        legal = self.getMacroActions(state, agentIndex, not branched >> agentIndex & 1)
+        if len(legal) > 1: branched |= 1 << agentIndex
+        value = float('inf')
+        for action in legal:
+            self.nodeNum += 1
+            self.plyNodes[self.searchDepth - dep] += 1
+            undo = state.makeMove(agentIndex, action, validate=False)
+            value = min(value, self.macro(state, nextAgent, dep, route, branched, alpha, beta))
+            state.unmakeMove(undo)
+            if value <= alpha:
+                self.cutoffs += 1
+                break
+            beta = min(beta, value)
+        return value
+
+    def getMacroActions(self, state, agentIndex, mayBranch=True):
+        """
+        The moves macro search tries for an agent other than the searcher:
+        the way on along a corridor, every action at a junction near the
+        searcher if mayBranch, nearest to the searcher first, else the step
+        that brings it closest to the searcher.
+        """
+        config = state.data.agentStates[agentIndex].configuration
+        moves = state.getMoveTable()
+        cell = moves.getCell(config)
+        if cell == None: return self.getSearchActions(state, agentIndex)
+        if not state.getJunctionGraph().isJunction(cell) and config.direction != Directions.STOP:
+            onward = moves.ghostActions[config.index]
+            if len(onward) == 1: return list(onward)
+        legal = self.getSearchActions(state, agentIndex)
+        if len(legal) < 2: return legal
+        distances = state.getMazeDistances()
+        target = moves.getCell(state.data.agentStates[self.index].configuration)
+        toSearcher = distances.getMatrix()[target]
+        steps = [(toSearcher[moves.getSuccessor(config, Actions.directionToCode(action)).index >> MoveTable.CELL_SHIFT], action)
+                 for action in legal]
+        if mayBranch and toSearcher[cell] <= self.macroRadius:
+            steps.sort(key=lambda step: step[0])
+            return [action for dist, action in steps]
+        return [min(steps)[1]]
+
+def _ponder(agent, connection, candidates):
+    "Searches the candidate states for MultimaxAgent.startPondering"
+    for key, state in candidates:
+        connection.send(('start', key))
+        connection.send(('done', key, agent.searchBestActions(state)))
+
+class SearchTimeout(Exception):
+    "Raised inside MultimaxAgent's search when the move's deadline passes"
+    pass
+
+# The searcher of a parallelRoot worker process
+_workerAgent = None
+
+def _initSearchWorker(options):
+    global _workerAgent
+    _workerAgent = MultimaxAgent(**options)
+
+def _searchSubtree(task):
+    "Runs MultimaxAgent.searchSubtree in a worker; None if the deadline passed"
+    state, path, depth, deadline = task
+    _workerAgent.deadline = deadline
+    # The rules draw random numbers during the search (who wins a collision),
+    # so seed them by the task, whichever worker runs it
+    random.seed(hash((hash(state), path)))
+    try:
+        return _workerAgent.searchSubtree(state, path, depth)
+    except SearchTimeout:
+        return None
+
+
+
+class ExpectimaxAgent(MultimaxAgent):
+    """
+    Expectiminimax on the searcher's score: the searcher maximizes it, the
+    agents declared stochastic (see Agent) are chance nodes weighted by
+    their getDistribution, and the other agents minimize it, as in
+    MultimaxAgent's paranoid mode.  Game.run tells it the agents through
+    registerAgents; until then every other agent is a minimizer.
+
+    Chance node values are cached by position hash, agent to move and depth,
+    relative to the searcher's score, for up to cacheSize entries (the
+    cache starts over when full).  The pruning agent argument bounds the
+    chance nodes with the range the searcher's score can reach (see
+    valueBounds):
+
+      none   evaluate every chance outcome
+      star1  (the default) stop once the outcomes seen so far decide the
+             node's value for the parent's window, and search each outcome
+             with the window that matters
+      star2  also probe every outcome's first reply first, which bounds
+             the node from the side the replying agent pushes; the probes
+             then bound each outcome in star1's search, and an exact probe
+             stands in for the first reply rather than being searched again
+
+    Star2 pays off only where the first reply is usually the best one and
+    chance nodes are followed by the searcher or a minimizer, since it has
+    nothing to probe below another chance node.  With the search actions
+    in their plain order, as here, most probes settle nothing, and star2
+    expands more nodes than star1 (see benchmarks.py expectimax).
+
+    The depth, anytime, moveTime and evaluator arguments work as in
+    MultimaxAgent; a non-score evaluator such as MazeDistanceEvaluator
+    needs pruning=none.
+    """
+    PRUNING = ('none', 'star1', 'star2')
+
+    # What the searcher's own move can add to its score at most: eating,
+    # less the cost of moving
+    EAT_GAIN = 20
+
+    # Expected values equal up to rounding count as ties, so that the cache
+    # and the pruning, which sum them in other orders, keep the same choices
+    TIE_TOLERANCE = 1e-6
+
+    def __init__(self, index=0, depth=5, pruning='star1', cacheSize=100000, anytime=False, moveTime=1.0,
+                 evaluator='ScoreEvaluator'):
+        MultimaxAgent.__init__(self, index, depth, 'paranoid', anytime=anytime, moveTime=moveTime, evaluator=evaluator)
+        if pruning not in ExpectimaxAgent.PRUNING:
+            raise Exception('Unknown pruning %s, use one of %s' % (pruning, ', '.join(ExpectimaxAgent.PRUNING)))
+        if pruning != 'none' and not self.evaluator.scoresOnly:
+            raise Exception('%s pruning needs the ScoreEvaluator' % pruning)
+        self.pruning = pruning
+        self.chanceModels = {}
+        self.maxGains = {}
+        self.cacheSize = int(cacheSize)
+        self.chanceCache = {}
+        self.cacheLayout = None
+        self.cacheHits = 0
+        self.cacheMisses = 0
+
+    def getTableHits(self):
+        "Chance cache hits so far, which getMoveStats reports as table hits"
+        return self.cacheHits
+
+    def registerAgents(self, agents):
+        MultimaxAgent.registerAgents(self, agents)
+        self.chanceModels = dict([(i, agent) for i, agent in enumerate(agents)
+                                  if i != self.index and agent and agent.stochastic])
+
+    def searchRoot(self, state, depth, legal):
+        self.searchDepth = depth
+        if state.data.layout is not self.cacheLayout:
+            self.chanceCache = {}
+            self.cacheLayout = state.data.layout
+        self.nodeNum += 1
+        self.plyNodes[0] += 1
+        nextAgent = (self.index + 1) % state.getNumAgents()
+        best = -float('inf')
+        bestActions = []
+        values = {}
+        for action in legal:
+            undo = state.makeMove(self.index, action, validate=False)
+            # alpha just below the best so far, so that ties get exact values
+            value = self.expectimax(state, nextAgent, depth - 1, best - 2 * ExpectimaxAgent.TIE_TOLERANCE, float('inf'))
+            state.unmakeMove(undo)
+            values[action] = value
+            if value > best + ExpectimaxAgent.TIE_TOLERANCE:
+                best = value
+                bestActions = [action]
+            elif value >= best - ExpectimaxAgent.TIE_TOLERANCE:
+                bestActions.append(action)
+        return bestActions, values
+
+    def expectimax(self, state, agentIndex, dep, alpha, beta, first=None):
+        """
+        Fail-soft expectiminimax value of state, agentIndex to move, with
+        the window (alpha, beta).  first, if given, is the exact value of
+        the first action of a max or min node, which star2 probed already.
+        """
+        self.nodeNum += 1
+        self.plyNodes[self.searchDepth - dep] += 1
+        if self.nodeNum & 255 == 0: self.checkDeadline()
+        model = self.chanceModels.get(agentIndex)
+        if model is None:
+            legal = self.getSearchActions(state, agentIndex)
+        else:
+            legal = state.getLegalActions(agentIndex)
+        if dep == 0 or not legal:
+            if legal: self.horizonReached = True
+            return self.evaluator.evaluate(state)[self.index]
+
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+        if model is not None:
+            return self.chanceValue(state, agentIndex, dep, alpha, beta, model, legal)
+
+        maximizing = agentIndex == self.index
+        if maximizing: value = -float('inf')
+        else: value = float('inf')
+        for action in legal:
+            if first is not None and action == legal[0]:
+                childValue = first
+            else:
+                undo = state.makeMove(agentIndex, action, validate=False)
+                childValue = self.expectimax(state, nextAgent, dep - 1, alpha, beta)
+                state.unmakeMove(undo)
+            if maximizing:
+                value = max(value, childValue)
+                if value >= beta:
+                    self.cutoffs += 1
+                    break
+                alpha = max(alpha, value)
+            else:
+                value = min(value, childValue)
+                if value <= alpha:
+                    self.cutoffs += 1
+                    break
+                beta = min(beta, value)
+        return value
+
+    def chanceValue(self, state, agentIndex, dep, alpha, beta, model, legal):
+        """
+        The expected value over the chance agent's actions, or with pruning,
+        a bound on it outside (alpha, beta).
+        """
+        key = (state.getPositionHash(), agentIndex, dep)
+        base = state.getScores()[self.index]
+        if key in self.chanceCache:
+            self.cacheHits += 1
+            return base + self.chanceCache[key]
+        self.cacheMisses += 1
+
+        dist = model.getDistribution(state)
+        outcomes = [(dist[action], action) for action in legal if dist[action] > 0]
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+        if self.pruning == 'none':
+            value = 0.0
+            for p, action in outcomes:
+                undo = state.makeMove(agentIndex, action, validate=False)
+                value += p * self.expectimax(state, nextAgent, dep - 1, -float('inf'), float('inf'))
+                state.unmakeMove(undo)
+        else:
+            low, high = self.valueBounds(state, agentIndex, dep)
+            # The bounds on every outcome's value, which star2's probes tighten
+            lows = [low] * len(outcomes)
+            highs = [high] * len(outcomes)
+            firsts = [None] * len(outcomes)
+            if self.pruning == 'star2':
+                bound, probes = self.probeOutcomes(state, agentIndex, dep, alpha, beta, outcomes, low, high)
+                if bound is not None: return bound
+                if probes is not None:
+                    firsts = [probe if exact else None for probe, exact in probes]
+                    probes = [probe for probe, exact in probes]
+                    if nextAgent == self.index: lows = probes
+                    else: highs = probes
+            value = 0.0
+            remainingLow = sum([p * bound for (p, action), bound in zip(outcomes, lows)])
+            remainingHigh = sum([p * bound for (p, action), bound in zip(outcomes, highs)])
+            for (p, action), outcomeLow, outcomeHigh, first in zip(outcomes, lows, highs, firsts):
+                remainingLow -= p * outcomeLow
+                remainingHigh -= p * outcomeHigh
+                # The window for this outcome, given the worst and best cases
+                # for the outcomes still to come
+                childAlpha = max(outcomeLow, (alpha - value - remainingHigh) / p)
+                childBeta = min(outcomeHigh, (beta - value - remainingLow) / p)
+                if childAlpha >= childBeta:
+                    # The probe already settles this outcome for the window
+                    childValue = outcomeLow if outcomeLow >= childBeta else outcomeHigh
+                else:
+                    undo = state.makeMove(agentIndex, action, validate=False)
+                    childValue = self.expectimax(state, nextAgent, dep - 1, childAlpha, childBeta, first)
+                    state.unmakeMove(undo)
+                    childValue = min(max(childValue, outcomeLow), outcomeHigh)
+                value += p * childValue
+                if value + remainingHigh <= alpha:
+                    self.cutoffs += 1
+                    return value + remainingHigh
+                if value + remainingLow >= beta:
+                    self.cutoffs += 1
+                    return value + remainingLow
+
+        if len(self.chanceCache) >= self.cacheSize:
+            self.chanceCache = {}
+        self.chanceCache[key] = value - base
+        return value
+
+    def probeOutcomes(self, state, agentIndex, dep, alpha, beta, outcomes, low, high):
+        """
+        Star2's probing phase: searches only the first reply of every outcome,
+        which bounds the outcome's value from one side when the replying
+        agent is a max node (from below) or a min node (from above).
+        Returns (bound, None) if the probes already settle the chance node,
+        else (None, probes) with a (bound, exact) pair for every outcome:
+        chanceValue searches with the bounds, and takes the first reply's
+        value as found when the probe's value was exact rather than cut off.
+        (None, None) when there is nothing to probe.
+        """
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+        if dep < 2 or nextAgent in self.chanceModels: return None, None
+        maximizing = nextAgent == self.index
+        bound = 0.0
+        remaining = 1.0
+        probes = []
+        for p, action in outcomes:
+            remaining -= p
+            undo = state.makeMove(agentIndex, action, validate=False)
+            replies = self.getSearchActions(state, nextAgent)
+            if replies:
+                self.nodeNum += 1
+                self.plyNodes[self.searchDepth - dep + 1] += 1
+                reply = state.makeMove(nextAgent, replies[0], validate=False)
+                if maximizing:
+                    childAlpha, childBeta = low, min(high, (beta - bound - remaining * high) / p)
+                else:
+                    childAlpha, childBeta = max(low, (alpha - bound - remaining * low) / p), high
+                probe = self.expectimax(state, (nextAgent + 1) % state.getNumAgents(), dep - 2, childAlpha, childBeta)
+                state.unmakeMove(reply)
+                exact = childAlpha < probe < childBeta
+            else:
+                probe = self.evaluator.evaluate(state)[self.index] # A terminal outcome has its exact value
+                exact = False
+            state.unmakeMove(undo)
+            probes.append((probe, exact))
+            bound += p * probe
+            if maximizing and bound + remaining * low >= beta:
+                self.cutoffs += 1
+                return bound + remaining * low, None
+            if not maximizing and bound + remaining * high <= alpha:
+                self.cutoffs += 1
+                return bound + remaining * high, None
+        return None, probes
+
+    def valueBounds(self, state, agentIndex, dep):
+        """
+        The lowest and highest score the searcher can have after the next dep
+        moves from state, agentIndex moving first.
+        """
+        low = self.scoreLowerBound(state, self.index, agentIndex, dep)
+        numAgents = state.getNumAgents()
+        key = (agentIndex, dep, numAgents)
+        if key not in self.maxGains:
+            if self.index in MultimaxAgent.EAT_COST:
+                ownMoves = len([ply for ply in range(dep) if (agentIndex + ply) % numAgents == self.index])
+                gain = ownMoves * (ExpectimaxAgent.EAT_GAIN - MultimaxAgent.MOVE_COST)
+            else:
+                gain = MultimaxAgent.COLLISION_COST
+            self.maxGains[key] = gain
+        return low, state.data.scores[self.index] + self.maxGains[key]
+
+class MCTSAgent(Agent):
+    """
+    Monte Carlo tree search with UCT.  Every playout walks down the tree,
+    each node's agent picking the child with the best upper confidence
+    bound on its own final score, adds one node, then plays on with a
+    cheap default policy for at most playoutDepth moves, and credits the
+    final scores to the nodes it went through.  The action played is the
+    most visited one.  Agent arguments:
+
+      playouts      playouts per move
+      timeLimit     seconds per move; if set, it replaces playouts
+      policy        default policy, 'random' or 'greedy' (best next score)
+      playoutDepth  moves per playout past the tree
+      exploration   the UCT exploration constant
+      reuseTree     keep the subtree of the reached state between moves
+
+    getNodeNum counts the moves made by the playouts, like the states
+    multimax expands, and playouts / searchTime gives the playout rate.
+    getMoveStats reports the nodes and playouts of the last move.
+    """
+    POLICIES = ('random', 'greedy')
+
+    # Score differences that count as one unit of reward for UCT
+    REWARD_SCALE = 100.0
+
+    def __init__(self, index=0, playouts=200, timeLimit=0, policy='random', playoutDepth=30,
+                 exploration=1.0, reuseTree=True):
+        if policy not in MCTSAgent.POLICIES:
+            raise Exception('Unknown policy %s, use one of %s' % (policy, ', '.join(MCTSAgent.POLICIES)))
+        self.index = index
+        self.numPlayouts = int(playouts)
+        self.timeLimit = float(timeLimit)
+        self.policy = policy
+        self.playoutDepth = int(playoutDepth)
+        self.exploration = float(exploration)
+        self.reuseTree = str(reuseTree).lower() in ('true', '1')
+        self.root = None
+        self.nodeNum = 0
+        self.playouts = 0
+        self.reusedPlayouts = 0
+        self.searchTime = 0.0
+        self.moveStats = {}
+
+    def getNodeNum(self):
+        return self.nodeNum
+
+    def getMoveStats(self):
+        return dict(self.moveStats)
+
+    def registerInitialState(self, gameState):
+        self.root = None
+
+    def getAction(self, gameState):
+        # The playouts make and unmake their moves on one copy
+        state = gameState.deepCopy()
+        root = self.findRoot(state)
+        self.reusedPlayouts += root.visits
+        nodeNum = self.nodeNum
+        start = time.time()
+        playouts = 0
+        while True:
+            if self.timeLimit > 0:
+                if time.time() - start >= self.timeLimit and playouts > 0: break
+            elif playouts >= self.numPlayouts: break
+            self.playout(state, root)
+            playouts += 1
+        self.playouts += playouts
+        self.searchTime += time.time() - start
+        self.moveStats = {'nodes': self.nodeNum - nodeNum, 'playouts': playouts}
+
+        mostVisits = max([child.visits for action, child in root.children])
+        bestChildren = [(action, child) for action, child in root.children if child.visits == mostVisits]
+        action, child = random.choice(bestChildren)
+        self.root = child
+        return action
+
+    def findRoot(self, state):
+        """
+        Returns the node of the tree kept from the last move that matches
+        state, the searcher to move, or else a new root.  The other agents
+        moved in between, so it is looked for below the node of the action
+        played.
+        """
+        if self.reuseTree and self.root is not None:
+            stateHash = hash(state)
+            level = [self.root]
+            for ply in range(state.getNumAgents()):
+                for node in level:
+                    if node.agentIndex == self.index and node.stateHash == stateHash:
+                        return node
+                level = [child for node in level for action, child in node.children]
+        return MCTSNode(state, self.index)
+
+    def playout(self, state, root):
+        records = []
+        path = [root]
+        node = root
+        numAgents = state.getNumAgents()
+
+        # Selection
+        while not node.untried and node.children:
+            action, node = self.selectChild(node)
+            records.append(state.makeMove(path[-1].agentIndex, action, validate=False))
+            path.append(node)
+
+        # Expansion
+        if node.untried:
+            action = node.untried.pop()
+            records.append(state.makeMove(node.agentIndex, action, validate=False))
+            child = MCTSNode(state, (node.agentIndex + 1) % numAgents)
+            node.children.append((action, child))
+            node = child
+            path.append(node)
+
+        # Simulation
+        agentIndex = node.agentIndex
+        for move in range(self.playoutDepth):
+            legal = state.getLegalActions(agentIndex)
+            if Directions.STOP in legal: legal.remove(Directions.STOP)
+            if not legal: break
+            action = self.defaultPolicy(state, agentIndex, legal)
+            records.append(state.makeMove(agentIndex, action, validate=False))
+            agentIndex = (agentIndex + 1) % numAgents
+
+        scores = state.getScores()
+        self.nodeNum += len(records)
+        for record in reversed(records):
+            state.unmakeMove(record)
+
+        # Backpropagation
+        for node in path:
+            node.visits += 1
+            totals = node.totals
+            for i in range(numAgents):
+                totals[i] += scores[i]
+
+    def selectChild(self, node):
+        "The child with the best UCT value for the agent to move at node"
+        agentIndex = node.agentIndex
+        logVisits = math.log(node.visits)
+        scale = MCTSAgent.REWARD_SCALE
+        bestValue = None
+        for action, child in node.children:
+            value = child.totals[agentIndex] / (scale * child.visits) + \
+                    self.exploration * math.sqrt(logVisits / child.visits)
+            if bestValue is None or value > bestValue:
+                bestValue, best = value, (action, child)
+        return best
+
+    def defaultPolicy(self, state, agentIndex, legal):
+        if self.policy == 'random':
+            return random.choice(legal)
+        scored = []
+        for action in legal:
+            record = state.makeMove(agentIndex, action, validate=False)
+            scored.append((state.data.scores[agentIndex], action))
+            state.unmakeMove(record)
+        bestScore = max(scored)[0]
+        return random.choice([action for score, action in scored if score == bestScore])
 
+class MCTSNode(SlottedObject):
+    """
+    A node of MCTSAgent's tree: the agent to move, the hash of the state
+    (to find the node again when the game reaches it), the actions not yet
+    expanded, the (action, child) pairs, the visits and the sum over them
+    of the final scores.
+    """
+    __slots__ = ('agentIndex', 'stateHash', 'untried', 'children', 'visits', 'totals')
 
+    def __init__(self, state, agentIndex):
+        self.agentIndex = agentIndex
+        self.stateHash = hash(state)
+        self.untried = state.getLegalActions(agentIndex)
+        if Directions.STOP in self.untried: self.untried.remove(Directions.STOP)
+        random.shuffle(self.untried)
+        self.children = []
+        self.visits = 0
+        self.totals = [0.0] * state.getNumAgents()
 
 class GreedyAgent(Agent):
 
@@ -62,13 +1650,14 @@ class GreedyAgent(Agent):
         legal = state.getLegalActions(self.index)
         if Directions.STOP in legal: legal.remove(Directions.STOP)
 
-        successors = [(state.generateSuccessor(self.index, action), action) for action in legal]
+        successors = [(state.generateSuccessor(self.index, action, validate=False), action) for action in legal]
         scored = [(state.getScores()[self.index], action) for state, action in successors]
         bestScore = max(scored)[0]
         bestActions = [pair[1] for pair in scored if pair[0] == bestScore]
         return random.choice(bestActions)
 
 class RandomAgent(Agent):
+    stochastic = True
 
     def getAction(self, state):
         dist = self.getDistribution(state)
@@ -40,9 +40,12 @@ To play your first game, type 'python pacman.py' from the command line.
 The keys are 'a', 's', 'd', and 'w' to move (or arrow keys).  Have fun!
 """
 from game import GameStateData
+from game import SlottedObject
 from game import Game
 from game import Directions
 from game import Actions
+from game import MoveTable
+from game import FoodDistances
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
@@ -57,7 +60,7 @@ from matplotlib import pyplot as pt
 # YOUR INTERFACE TO THE PACMAN WORLD: A GameState #
 ###################################################
 
-class GameState:
+class GameState(SlottedObject):
     """
     A GameState specifies the full game state, including the food, capsules,
     agent configurations and score changes.
@@ -72,19 +75,31 @@ class GameState:
     Note that in classic Pacman, Pacman is always agent 0, Ghost is always agent 1,
     Opponent is always agent 2.
     """
+    __slots__ = ('data',)
 
     ####################################################
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
-    explored = set()
+    # static variable keeps track of which states have been generated; off
+    # unless enabled with setExplorationTracking (see util.ExplorationTracker)
+    explored = util.ExplorationTracker()
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
-        GameState.explored = set()
+        tmp = GameState.explored.getStates()
+        GameState.explored.reset()
         return tmp
     getAndResetExplored = staticmethod(getAndResetExplored)
 
+    def setExplorationTracking( mode, capacity=10000 ):
+        """
+        Replaces the explored-state tracker.  mode is 'off', 'count', 'lru'
+        (keep the last `capacity` states) or 'full'.  It records the states
+        that generateSuccessor and makeMove produce, so search nodes count
+        whichever way the search walks the tree.
+        """
+        GameState.explored = util.ExplorationTracker(mode, capacity)
+    setExplorationTracking = staticmethod(setExplorationTracking)
+
     def getLegalActions( self, agentIndex ):
         """
         Returns the legal actions for the agent specified.
@@ -100,41 +115,95 @@ class GameState:
             return GhostRules.getLegalActions( self, agentIndex )
 
 
-    def generateSuccessor( self, agentIndex, action):
+    def generateSuccessor( self, agentIndex, action, validate=True ):
         """
         Returns the successor state after the specified agent takes the action.
+
+        Search and learning code that took the action from getLegalActions can
+        pass validate=False to skip checking it again.  The game itself always
+        validates, so illegal moves by agents are still caught.
         """
         # Check that successors exist
         if self.isGhostWin() or self.isGhostLose(): raise Exception('Can\'t generate a successor of a terminal state.')
 
         # Copy current state
         state = GameState(self)
+        state._applyMove( agentIndex, action, validate )
+        GameState.explored.add(self)
+        GameState.explored.add(state)
+        return state
+
+    def makeMove( self, agentIndex, action, validate=True ):
+        """
+        Applies the action to this state in place, exactly as generateSuccessor
+        would to a copy, and returns a MoveRecord that unmakeMove uses to undo
+        it.  Meant for search, which can then walk the whole tree with one
+        state: use it on a private deepCopy, since any other holder of this
+        state sees the change.  Moves must be undone in reverse order.
+        validate works as in generateSuccessor.
+        """
+        if self.isGhostWin() or self.isGhostLose(): raise Exception('Can\'t generate a successor of a terminal state.')
+
+        record = MoveRecord( agentIndex, self.data )
+        self.data.scoreChange = [0] * len( self.data.agentStates )
+        self.data._foodEaten = None
+        self._applyMove( agentIndex, action, validate )
+        explored = GameState.explored
+        if explored.mode != 'off':
+            # This state changes again on unmakeMove, so keep a copy of it
+            if explored.mode == 'count': explored.add(self)
+            else: explored.add(self.deepCopy())
+        return record
+
+    def unmakeMove( self, record ):
+        """
+        Restores the state as it was before the makeMove that returned record.
+        """
+        data = self.data
+        for i, change in enumerate( data.scoreChange ):
+            data.scores[i] -= change
+        if record.agentIndex >= 2:
+            data.moveGhost( data.agentStates[record.agentIndex].configuration, record.configuration )
+        data.agentStates[record.agentIndex].configuration = record.configuration
+        data.food = record.food
+        data.scoreChange = record.scoreChange
+        data._foodEaten = record.foodEaten
+        data._agentMoved = record.agentMoved
+        data._pacDied = record.pacDied
+        data._oppDied = record.oppDied
+        data._gstLose = record.gstLose
+        data._hash = record.hash
+
+    def _applyMove( self, agentIndex, action, validate=True ):
+        """
+        Lets the rules apply the action to this state's own data.
+        """
+        oldConfiguration = self.data.agentStates[agentIndex].configuration
 
         # Let agent's logic deal with its action's effects on the board
         if agentIndex == 0:  # Pacman is moving
             #state.data._eaten = [False for i in range(state.getNumAgents())]
-            PacmanRules.applyAction( state, action)
+            PacmanRules.applyAction( self, action, validate )
         elif agentIndex == 1:
-            OpponentRules.applyAction( state, action)
+            OpponentRules.applyAction( self, action, validate )
         else:                # A ghost is moving
-            GhostRules.applyAction( state, action, agentIndex )
+            GhostRules.applyAction( self, action, agentIndex, validate )
+            self.data.moveGhost( oldConfiguration, self.data.agentStates[agentIndex].configuration )
 
         # Time passes
         if agentIndex == 0 or agentIndex == 1:
-            state.data.scoreChange[agentIndex] += -TIME_PENALTY # Penalty for waiting around
+            self.data.scoreChange[agentIndex] += -TIME_PENALTY # Penalty for waiting around
         # else:
         #     GhostRules.decrementTimer( state.data.agentStates[agentIndex] )
 
         # Resolve multi-agent effects
-        GhostRules.checkDeath( state, agentIndex )
+        GhostRules.checkDeath( self, agentIndex )
 
         # Book keeping
-        state.data._agentMoved = agentIndex
+        self.data._agentMoved = agentIndex
         for i in range(self.getNumAgents()):
-            state.data.scores[i] += state.data.scoreChange[i]
-        GameState.explored.add(self)
-        GameState.explored.add(state)
-        return state
+            self.data.scores[i] += self.data.scoreChange[i]
+        self.data.updateHash( agentIndex, oldConfiguration )
 
     def getLegalPacmanActions( self ):
         return self.getLegalActions( 0 )
@@ -214,6 +283,43 @@ class GameState:
         """
         return self.data.food
 
+    def getMoveTable(self):
+        """
+        Returns the precomputed MoveTable of the board (see game.py), which
+        answers legal action and legal neighbor queries by cell.
+        """
+        return self.data.layout.getMoveTable()
+
+    def getMazeDistances(self):
+        """
+        Returns the precomputed MazeDistances of the board (see game.py), the
+        maze distance between any two cells.
+        """
+        return self.data.layout.getMazeDistances()
+
+    def getFoodDistances(self):
+        """
+        Returns the maze distance from every cell to the nearest food, an
+        int16 array indexed by MoveTable cell, MazeDistances.UNREACHABLE
+        where no food can be reached.
+
+        The states of a game share their fields (see game.FoodDistances):
+        the field for the starting food is computed once per layout, and
+        the others are repaired from the last one made, searching again
+        only the cells whose nearest food was eaten.
+        """
+        data = self.data
+        if data._foodDistances is None:
+            data._foodDistances = FoodDistances(data.layout)
+        return data._foodDistances.get(data.food)
+
+    def getJunctionGraph(self):
+        """
+        Returns the precomputed JunctionGraph of the board (see game.py): its
+        junctions and the corridors between them.
+        """
+        return self.data.layout.getJunctionGraph()
+
     def getWalls(self):
         """
         Returns a Grid of boolean wall indicator variables.
@@ -227,7 +333,7 @@ class GameState:
         return self.data.layout.walls
 
     def hasFood(self, x, y):
-        return self.data.food[x][y]
+        return self.data.food.get(x, y)
 
     def hasWall(self, x, y):
         return self.data.layout.walls[x][y]
@@ -282,6 +388,13 @@ class GameState:
         """
         return hash( self.data )
 
+    def getPositionHash( self ):
+        """
+        A hash of the state without the scores (see GameStateData.positionHash),
+        for search caches that store values relative to the current scores.
+        """
+        return self.data.positionHash()
+
     def __str__( self ):
 
         return str(self.data)
@@ -292,6 +405,27 @@ class GameState:
         """
         self.data.initialize(layout, numGhostAgents)
 
+class MoveRecord(SlottedObject):
+    """
+    What GameState.makeMove needs to undo a move: the moved agent and its old
+    configuration, the old food grid (it is replaced when a pellet is eaten),
+    the old score changes, terminal flags and hash.  The scores themselves are
+    restored by subtracting the move's score changes.
+    """
+    __slots__ = ('agentIndex', 'configuration', 'food', 'scoreChange', 'foodEaten',
+                 'agentMoved', 'pacDied', 'oppDied', 'gstLose', 'hash')
+    def __init__( self, agentIndex, data ):
+        self.agentIndex = agentIndex
+        self.configuration = data.agentStates[agentIndex].configuration
+        self.food = data.food
+        self.scoreChange = data.scoreChange
+        self.foodEaten = data._foodEaten
+        self.agentMoved = data._agentMoved
+        self.pacDied = data._pacDied
+        self.oppDied = data._oppDied
+        self.gstLose = data._gstLose
+        self.hash = data._hash
+
 ############################################################################
 #                     THE HIDDEN SECRETS OF PACMAN                         #
 #                                                                          #
@@ -379,47 +513,62 @@ class PacmanRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions( state.getPacmanState().configuration, state.data.layout.walls )
+        return list( PacmanRules.getPossibleActions( state ) )
     getLegalActions = staticmethod( getLegalActions )
 
-    def applyAction( state, action):
+    def getPossibleActions( state ):
         """
-        Edits the state to reflect the results of the action.
+        Returns the precomputed tuple of possible actions; do not modify.
         """
-        legal = PacmanRules.getLegalActions( state )
-        if action not in legal:
-            raise Exception("Illegal action " + str(action))
+        return state.data.layout.getMoveTable().getPossibleActions( state.data.agentStates[0].configuration )
+    getPossibleActions = staticmethod( getPossibleActions )
 
+    def applyAction( state, action, validate=True ):
+        """
+        Edits the state to reflect the results of the action.  With
+        validate=False the caller guarantees the action is legal.
+        """
         pacmanState = state.data.agentStates[0]
+        moves = state.data.layout.getMoveTable()
+        code = Actions._directionCodes.get( action )
+        if validate and (code is None or not moves.canMove( pacmanState.configuration, code )):
+            raise Exception("Illegal action " + str(action))
 
         # Update Configuration
-        vector = Actions.directionToVector( action, PacmanRules.PACMAN_SPEED )
-        pacmanState.configuration = pacmanState.configuration.generateSuccessor( vector )
+        pacmanState.configuration = moves.getSuccessor( pacmanState.configuration, code, PacmanRules.PACMAN_SPEED )
 
         # Eat
-        next = pacmanState.configuration.getPosition()
-        nearest = nearestPoint( next )
-        if manhattanDistance( nearest, next ) <= 0.5 :
-            # Remove food
-            PacmanRules.consume( nearest, state)
+        cell = moves.getCell( pacmanState.configuration )
+        if cell != None:
+            PacmanRules.consumeCell( cell, state )
+        else:
+            next = pacmanState.configuration.getPosition()
+            nearest = nearestPoint( next )
+            if manhattanDistance( nearest, next ) <= 0.5 :
+                # Remove food
+                PacmanRules.consume( nearest, state)
     applyAction = staticmethod( applyAction )
 
     def consume( position, state):
         x,y = position
+        PacmanRules.consumeCell( x * state.data.food.height + y, state )
+    consume = staticmethod( consume )
+
+    def consumeCell( cell, state):
+        food = state.data.food
         # Eat food
-        if state.data.food[x][y]:
+        if food.hasCell(cell):
             state.data.scoreChange[0] += 20
             state.data.scoreChange[1] -= 10
             state.data.scoreChange[2] -= 10            
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
-            state.data._foodEaten = position
-            # TODO: cache numFood?
+            state.data.food = food = food.copy()
+            food.clearCell(cell)
+            state.data._foodEaten = divmod(cell, food.height)
             numFood = state.getNumFood()
             if numFood == 0 and not state.data._oppDied and not state.data._pacDied:
                 state.data._gstLose = True
 
-    consume = staticmethod( consume )
+    consumeCell = staticmethod( consumeCell )
 
 class OpponentRules:
     PACMAN_SPEED=1
@@ -428,47 +577,62 @@ class OpponentRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions( state.getOpponentState().configuration, state.data.layout.walls )
+        return list( OpponentRules.getPossibleActions( state ) )
     getLegalActions = staticmethod( getLegalActions )
 
-    def applyAction( state, action):
+    def getPossibleActions( state ):
         """
-        Edits the state to reflect the results of the action.
+        Returns the precomputed tuple of possible actions; do not modify.
         """
-        legal = OpponentRules.getLegalActions( state )
-        if action not in legal:
-            raise Exception("Illegal action " + str(action))
+        return state.data.layout.getMoveTable().getPossibleActions( state.data.agentStates[1].configuration )
+    getPossibleActions = staticmethod( getPossibleActions )
 
+    def applyAction( state, action, validate=True ):
+        """
+        Edits the state to reflect the results of the action.  With
+        validate=False the caller guarantees the action is legal.
+        """
         opponentState = state.data.agentStates[1]
+        moves = state.data.layout.getMoveTable()
+        code = Actions._directionCodes.get( action )
+        if validate and (code is None or not moves.canMove( opponentState.configuration, code )):
+            raise Exception("Illegal action " + str(action))
 
         # Update Configuration
-        vector = Actions.directionToVector( action, OpponentRules.PACMAN_SPEED )
-        opponentState.configuration = opponentState.configuration.generateSuccessor( vector )
+        opponentState.configuration = moves.getSuccessor( opponentState.configuration, code, OpponentRules.PACMAN_SPEED )
 
         # Eat
-        next = opponentState.configuration.getPosition()
-        nearest = nearestPoint( next )
-        if manhattanDistance( nearest, next ) <= 0.5 :
-            # Remove food
-            OpponentRules.consume( nearest, state)
+        cell = moves.getCell( opponentState.configuration )
+        if cell != None:
+            OpponentRules.consumeCell( cell, state )
+        else:
+            next = opponentState.configuration.getPosition()
+            nearest = nearestPoint( next )
+            if manhattanDistance( nearest, next ) <= 0.5 :
+                # Remove food
+                OpponentRules.consume( nearest, state)
     applyAction = staticmethod( applyAction )
 
     def consume( position, state):
         x,y = position
+        OpponentRules.consumeCell( x * state.data.food.height + y, state )
+    consume = staticmethod( consume )
+
+    def consumeCell( cell, state):
+        food = state.data.food
         # Eat food
-        if state.data.food[x][y]:
+        if food.hasCell(cell):
             state.data.scoreChange[1] += 20  
             state.data.scoreChange[0] -= 20
             state.data.scoreChange[2] -= 20          
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
-            state.data._foodEaten = position
-            # TODO: cache numFood?
+            state.data.food = food = food.copy()
+            food.clearCell(cell)
+            state.data._foodEaten = divmod(cell, food.height)
             numFood = state.getNumFood()
             if numFood == 0 and not state.data._oppDied and not state.data._pacDied:
                 state.data._gstLose = True
 
-    consume = staticmethod( consume )
+    consumeCell = staticmethod( consumeCell )
 
 
 class GhostRules:
@@ -481,27 +645,28 @@ class GhostRules:
         Ghosts cannot stop, and cannot turn around unless they
         reach a dead end, but can turn 90 degrees at intersections.
         """
-        conf = state.getGhostState( ghostIndex ).configuration
-        possibleActions = Actions.getPossibleActions( conf, state.data.layout.walls )
-        reverse = Actions.reverseDirection( conf.direction )
-        if Directions.STOP in possibleActions:
-            possibleActions.remove( Directions.STOP )
-        if reverse in possibleActions and len( possibleActions ) > 1:
-            possibleActions.remove( reverse )
-        return possibleActions
+        return list( GhostRules.getPossibleActions( state, ghostIndex ) )
     getLegalActions = staticmethod( getLegalActions )
 
-    def applyAction( state, action, ghostIndex = 2):
+    def getPossibleActions( state, ghostIndex = 2):
+        """
+        Returns the precomputed tuple of ghost actions; do not modify.
+        """
+        conf = state.getGhostState( ghostIndex ).configuration
+        return state.data.layout.getMoveTable().getGhostActions( conf )
+    getPossibleActions = staticmethod( getPossibleActions )
 
-        legal = GhostRules.getLegalActions( state, ghostIndex )
-        if action not in legal:
-            raise Exception("Illegal ghost action " + str(action))
+    def applyAction( state, action, ghostIndex = 2, validate=True ):
 
         ghostState = state.data.agentStates[ghostIndex]
+        moves = state.data.layout.getMoveTable()
+        code = Actions._directionCodes.get( action )
+        if validate and (code is None or not moves.canGhostMove( ghostState.configuration, code )):
+            raise Exception("Illegal ghost action " + str(action))
+
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0: speed /= 2.0
-        vector = Actions.directionToVector( action, speed )
-        ghostState.configuration = ghostState.configuration.generateSuccessor( vector )
+        ghostState.configuration = moves.getSuccessor( ghostState.configuration, code, speed )
     applyAction = staticmethod( applyAction )
 
     def decrementTimer( ghostState):
@@ -512,29 +677,51 @@ class GhostRules:
     decrementTimer = staticmethod( decrementTimer )
 
     def checkDeath( state, agentIndex):
-        pacPosition = state.getPacmanPosition()
-        oppPosition = state.getOpponentPosition()
+        agentStates = state.data.agentStates
+        pacConfig = agentStates[0].configuration
+        oppConfig = agentStates[1].configuration
         if agentIndex == 0: # Pacman just moved;
-            ghostState = state.data.agentStates[2]
-            ghostPosition = ghostState.configuration.getPosition()
-            if GhostRules.canKill( pacPosition, ghostPosition ):
+            if GhostRules.meetsGhost( state, pacConfig ):
                 GhostRules.collide( state, agentIndex )
         elif agentIndex == 1: 
-            ghostState = state.data.agentStates[2]
-            ghostPosition = ghostState.configuration.getPosition()
-            if GhostRules.canKill( oppPosition, ghostPosition ):
+            if GhostRules.meetsGhost( state, oppConfig ):
                 GhostRules.collide( state, agentIndex )
         else:
-            ghostState = state.data.agentStates[agentIndex]
-            ghostPosition = ghostState.configuration.getPosition()
-            if GhostRules.canKill( pacPosition, ghostPosition ) and GhostRules.canKill(oppPosition, ghostPosition):
+            ghostConfig = agentStates[agentIndex].configuration
+            pacKilled = GhostRules.collides( pacConfig, ghostConfig )
+            oppKilled = GhostRules.collides( oppConfig, ghostConfig )
+            if pacKilled and oppKilled:
                 GhostRules.collide( state, random.randint(0, 1) )
-            elif GhostRules.canKill( pacPosition, ghostPosition ):
+            elif pacKilled:
                 GhostRules.collide( state, 0 )
-            elif GhostRules.canKill(oppPosition, ghostPosition):
+            elif oppKilled:
                 GhostRules.collide( state, 1 )
     checkDeath = staticmethod( checkDeath )
 
+    def meetsGhost( state, config ):
+        """
+        Whether an agent at config collides with any ghost, looked up in the
+        ghost occupancy index (see GameStateData) unless a ghost or the agent
+        is off the grid points.
+        """
+        cells = state.data._ghostCells
+        if config.index != None and None not in cells:
+            return config.index >> MoveTable.CELL_SHIFT in cells
+        for ghostState in state.data.agentStates[2:]:
+            if GhostRules.collides( config, ghostState.configuration ): return True
+        return False
+    meetsGhost = staticmethod( meetsGhost )
+
+    def collides( config, ghostConfig ):
+        """
+        Whether an agent at config and a ghost at ghostConfig collide.  Two
+        interned configurations collide exactly when they share a cell.
+        """
+        if config.index != None and ghostConfig.index != None:
+            return config.index >> MoveTable.CELL_SHIFT == ghostConfig.index >> MoveTable.CELL_SHIFT
+        return GhostRules.canKill( config.getPosition(), ghostConfig.getPosition() )
+    collides = staticmethod( collides )
+
     def collide(state, agentIndex):
         if not state.data._gstLose:
             state.data.scoreChange[agentIndex] -= 200
@@ -637,6 +824,12 @@ def readCommand( argv ):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--explored', dest='explored', type='choice', choices=util.ExplorationTracker.MODES,
+                      help=default('How to track the states generated by play and search: off, count, lru or full'), default='off')
+    parser.add_option('--exploredSize', dest='exploredSize', type='int',
+                      help=default('How many recent states the lru explored tracker keeps'), default=10000)
+    parser.add_option('--telemetry', dest='telemetry',
+                      help='Writes the per-move telemetry of the agents to this file, one JSON object per line', default=None)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
@@ -646,6 +839,9 @@ def readCommand( argv ):
     # Fix the random seed
     if options.fixRandomSeed: random.seed('cs188')
 
+    # Track explored states
+    GameState.setExplorationTracking(options.explored, options.exploredSize)
+
     # Choose a layout
     args['layout'] = layout.getLayout( options.layout )
     if args['layout'] == None: raise Exception("The layout " + options.layout + " cannot be found")
@@ -696,6 +892,7 @@ def readCommand( argv ):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['telemetry'] = options.telemetry
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
@@ -752,7 +949,48 @@ def replayGame( layout, actions, display ):
 
     display.finish()
 
-def runGames( layout, pacman, ghosts, opponent, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30 ):
+# The per-move telemetry that runGames summarizes (see Agent in game.py)
+MOVE_STATS = ('nodes', 'branching', 'cutoffs', 'ttHits', 'depth', 'time')
+
+def summarizeMoveStats(games):
+    """
+    Prints the mean, median, 95th percentile and maximum per move of the
+    telemetry of every agent that reports it, over the games.
+    """
+    byAgent = {}
+    for game in games:
+        for stats in game.moveStats:
+            byAgent.setdefault(stats['agent'], []).append(stats)
+    for agentIndex in sorted(byAgent):
+        moves = byAgent[agentIndex]
+        print 'Move telemetry, agent %d (%s), %d moves:' % \
+            (agentIndex, games[0].agents[agentIndex].__class__.__name__, len(moves))
+        print '  %-12s %s' % ('', ''.join(['%10s' % name for name in ('mean', 'p50', 'p95', 'max')]))
+        for key in MOVE_STATS:
+            values = np.array([stats[key] for stats in moves if key in stats], dtype=float)
+            if len(values) == 0: continue
+            print '  %-12s %s' % (key, ''.join(['%10.3f' % value for value in
+                (values.mean(), np.percentile(values, 50), np.percentile(values, 95), values.max())]))
+        plies = [stats['nodesByDepth'] for stats in moves if 'nodesByDepth' in stats]
+        if plies:
+            means = [sum([nodes[ply] for nodes in plies if ply < len(nodes)]) / float(len(plies))
+                     for ply in range(max([len(nodes) for nodes in plies]))]
+            print '  %-12s %s' % ('nodes/depth', ' '.join(['%.1f' % mean for mean in means]))
+
+def writeMoveStats(games, fileName):
+    "Writes the telemetry of every move of the games as JSON lines, tagged with the game's number"
+    import json
+    f = open(fileName, 'w')
+    try:
+        for i, game in enumerate(games):
+            for stats in game.moveStats:
+                record = dict(stats)
+                record['game'] = i
+                f.write(json.dumps(record, sort_keys=True) + '\n')
+    finally:
+        f.close()
+
+def runGames( layout, pacman, ghosts, opponent, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30, telemetry=None ):
     import __main__
     __main__.__dict__['_display'] = display
 
@@ -804,8 +1042,33 @@ def runGames( layout, pacman, ghosts, opponent, display, numGames, record, numTr
         # print 'Ghost Win Rate:      %d/%d (%.2f)' % (ghostWins.count(True), len(ghostWins), ghostWinRate)
         # print 'Record:       ', ', '.join([ ['Loss', 'Win'][int(w)] for w in ghostWins])
         print 'Pacman average Nodes checked:', sum([game.totalNodes for game in games]) / float(len(games))
+        explored = GameState.explored
+        if explored.mode != 'off':
+            print 'Explored states:       %d generated, %d retained (%s), %.1f KB' % \
+                (explored.numAdded, len(explored), explored.mode, explored.getMemoryUsage() / 1024.0)
+        depthLog = getattr(pacman, 'depthLog', None)
+        if depthLog:
+            print 'Search depth reached:  mean %.1f, min %d, max %d over %d moves' % \
+                (sum(depthLog) / float(len(depthLog)), min(depthLog), max(depthLog), len(depthLog))
+        summarizeMoveStats(games)
+        if getattr(pacman, 'orderedNodes', 0):
+            print 'Move ordering:         first child best at %d/%d nodes (%.2f)' % \
+                (pacman.firstBest, pacman.orderedNodes, pacman.firstBest / float(pacman.orderedNodes))
+        if getattr(pacman, 'playouts', 0):
+            print 'MCTS playouts:         %d in %.1f s (%.0f/s), %d reused' % \
+                (pacman.playouts, pacman.searchTime, pacman.playouts / max(pacman.searchTime, 1e-9), pacman.reusedPlayouts)
+        if getattr(pacman, 'ponder', False):
+            print 'Pondering:             %.1f s in the background, %d moves reused a pondered search, %d did not' % \
+                (pacman.ponderTime, pacman.ponderHits, pacman.ponderMisses)
+        table = getattr(pacman, 'transpositionTable', None)
+        if table is not None:
+            print 'Transposition table:   %d hits, %d misses, %d evictions, %d/%d entries (%s), %.1f KB' % \
+                (table.hits, table.misses, table.evictions, len(table), table.capacity, table.policy, table.getMemoryUsage() / 1024.0)
 
         
+        if telemetry:
+            writeMoveStats(games, telemetry)
+
         pt.plot(learningWinRate)
 
         pt.ylabel("Win Rate")
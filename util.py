@@ -16,6 +16,7 @@ import sys
 import inspect
 import heapq, random
 import cStringIO
+import collections
 
 
 class FixedRandom:
@@ -202,6 +203,189 @@ class PriorityQueueWithFunction(PriorityQueue):
         PriorityQueue.push(self, item, self.priorityFunction(item))
 
 
+def deepSizeOf(obj, exclude, seen=None):
+    """
+    Returns the bytes used by obj and everything it references, skipping
+    strings, objects in `exclude` and what only they reference, and counting
+    each object once.
+    """
+    if seen is None: seen = set()
+    if id(obj) in seen or id(obj) in exclude or isinstance(obj, str): return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, int, long, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        children = obj.keys() + obj.values()
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        children = list(obj)
+    else:
+        children = []
+        if hasattr(obj, '__dict__'):
+            children.append(obj.__dict__)
+        for cls in type(obj).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if hasattr(obj, name): children.append(getattr(obj, name))
+    for child in children:
+        size += deepSizeOf(child, exclude, seen)
+    return size
+
+class ExplorationTracker:
+    """
+    Records the states generated during play and search.  The mode is one of
+
+      'off'   - record nothing (the default)
+      'count' - only count the states added
+      'lru'   - also keep the most recent `capacity` distinct states
+      'full'  - keep every distinct state, e.g. for visualization
+
+    Only 'full' grows without bound, so long unattended runs should use one
+    of the other modes.
+    """
+    MODES = ('off', 'count', 'lru', 'full')
+
+    # Retained states that getMemoryUsage sizes to estimate all of them
+    SAMPLE_SIZE = 50
+
+    def __init__(self, mode='off', capacity=10000):
+        if mode not in ExplorationTracker.MODES:
+            raise Exception('Unknown exploration mode ' + str(mode))
+        self.mode = mode
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self.numAdded = 0
+        if self.mode == 'lru':
+            self.states = collections.OrderedDict()
+        elif self.mode == 'full':
+            self.states = set()
+        else:
+            self.states = None
+
+    def add(self, state):
+        if self.mode == 'off': return
+        self.numAdded += 1
+        if self.mode == 'full':
+            self.states.add(state)
+        elif self.mode == 'lru':
+            if state in self.states:
+                del self.states[state]
+            elif len(self.states) >= self.capacity:
+                self.states.popitem(last=False)
+            self.states[state] = True
+
+    def getStates(self):
+        "Returns the retained states as a set (empty unless 'lru' or 'full')"
+        if self.states is None: return set()
+        return set(self.states)
+
+    def __len__(self):
+        if self.states is None: return 0
+        return len(self.states)
+
+    def getMemoryUsage(self):
+        """
+        Returns an estimate of the bytes the tracker keeps alive: its own
+        containers and the retained states.  The states are sized with
+        deepSizeOf over a sample of SAMPLE_SIZE of them.  What the first two
+        sampled states both reference (the layout and its tables, say)
+        counts once, and the rest at the sample's mean per retained state.
+        """
+        size = sys.getsizeof(self)
+        if self.states is None: return size
+        size += sys.getsizeof(self.states)
+        if self.mode == 'lru':
+            # OrderedDict keeps a [prev, next, key] link per entry
+            size += len(self.states) * sys.getsizeof([None, None, None])
+        sample = []
+        for state in self.states:
+            if len(sample) == ExplorationTracker.SAMPLE_SIZE: break
+            sample.append(state)
+        if not sample: return size
+        shared = set()
+        if len(sample) > 1:
+            deepSizeOf(sample[0], set(), shared)
+            reached = set()
+            deepSizeOf(sample[1], set(), reached)
+            shared &= reached
+        size += deepSizeOf(sample[0], set()) - deepSizeOf(sample[0], shared)
+        perState = sum([deepSizeOf(state, shared) for state in sample]) / float(len(sample))
+        return size + int(perState * len(self.states))
+
+class TranspositionTable:
+    """
+    A fixed-size table of game-tree search results, for positions reached
+    through different move orders.  An entry holds the depth the position
+    was searched to, its value, the best action found and a flag telling
+    whether the value is EXACT or only a LOWER or UPPER bound.
+
+    Keys hash to one slot each, and `capacity` slots bound the memory.
+    When a key lands on a slot in use by another key, the policy decides:
+
+      'depth'  - keep the entry searched deeper, unless it is left over
+                 from an earlier search (see newSearch)
+      'always' - replace it
+
+    The table counts lookup hits and misses, and evictions of entries by
+    another key.
+    """
+    POLICIES = ('depth', 'always')
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, capacity=65536, policy='depth'):
+        if policy not in TranspositionTable.POLICIES:
+            raise Exception('Unknown replacement policy ' + str(policy))
+        self.capacity = max(1, int(capacity))
+        self.policy = policy
+        self.hits = self.misses = self.evictions = 0
+        self.clear()
+
+    def clear(self):
+        "Empties the table; the counts are kept"
+        self.slots = [None] * self.capacity
+        self.numEntries = 0
+        self.generation = 0
+
+    def newSearch(self):
+        "Marks the entries stored so far as old, so 'depth' lets them go"
+        self.generation += 1
+
+    def lookup(self, key):
+        """
+        Returns (depth, value, action, flag) stored for key, or None.
+        """
+        entry = self.slots[hash(key) % self.capacity]
+        if entry is None or entry[0] != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1:5]
+
+    def store(self, key, depth, value, action, flag=0):
+        slot = hash(key) % self.capacity
+        entry = self.slots[slot]
+        if entry is None:
+            self.numEntries += 1
+        elif entry[0] != key:
+            if self.policy == 'depth' and entry[5] == self.generation and entry[1] > depth:
+                return
+            self.evictions += 1
+        elif self.policy == 'depth' and entry[1] > depth and entry[4] == TranspositionTable.EXACT:
+            # A shallower result for the same key adds nothing
+            return
+        self.slots[slot] = (key, depth, value, action, flag, self.generation)
+
+    def __len__(self):
+        return self.numEntries
+
+    def getMemoryUsage(self):
+        """
+        Returns the bytes used by the slots and the entry tuples, not counting
+        the keys, values and actions they hold.
+        """
+        return sys.getsizeof(self.slots) + self.numEntries * sys.getsizeof((None,) * 6)
+
 def manhattanDistance( xy1, xy2 ):
     "Returns the Manhattan distance between points xy1 and xy2"
     return abs( xy1[0] - xy2[0] ) + abs( xy1[1] - xy2[1] )